@@ -3,15 +3,25 @@ from math import pi
 from hume.simulator.circuit import QuantumCircuit, QuantumRegister
 from hume.qiskit.util import hume_to_qiskit
 
-from components.common import Display, arg_gates, add_gate, state_table_to_string
+from components.common import Steps, Display, arg_gates, add_gate, state_table_to_string
 
 
-class AnyQubit():
+# bytes of step states kept in memory, the other steps are recomputed from checkpoints when shown
+REPORT_BUDGET = 2 ** 28
+
+
+class AnyQubit(Steps):
 
     def __init__(self, qubits, display=Display.BROWSER):
         self.display = display
+        self.redo_steps = []
         self.qubits = qubits
-        self.qc = QuantumCircuit(QuantumRegister(qubits))
+        self.qc = self.new_circuit()
+
+    def new_circuit(self):
+        qc = QuantumCircuit(QuantumRegister(self.qubits))
+        qc.reports.budget = REPORT_BUDGET
+        return qc
 
     def apply_gate(self, target, gate, angle=None, report=True):
         gate = gate.lower()
@@ -20,12 +30,14 @@ class AnyQubit():
         add_gate(self.qc, [], target, gate, angle / 180 * pi if gate in arg_gates else None)
         if report:
             self.qc.report(f'Step {len(self.qc.reports) + 1}')
+            # a new gate starts a new branch
+            self.redo_steps = []
 
     def get_state(self):
         if not self.qc.reports:
             state = self.qc.state
         else:
-            state = self.qc.reports[f'Step {len(self.qc.reports)}'][2]
+            state = self.qc.reports.end_state(f'Step {len(self.qc.reports)}')
 
         if self.display == Display.TERMINAL:
             return f'{state_table_to_string(state, display=Display.TERMINAL)}'
@@ -41,7 +53,8 @@ class AnyQubit():
     #     return self.qc.report(f'Step {len(self.qc.reports)}')[2]
 
     def reset(self):
-        self.qc = QuantumCircuit(QuantumRegister(self.qubits))
+        self.redo_steps = []
+        self.qc = self.new_circuit()
 
     def last_step(self):
         return len(self.qc.reports)
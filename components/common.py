@@ -34,6 +34,43 @@ def add_gate(qc, cs, target, gate, angle):
             m(angle, int(target))
 
 
+class Steps:
+    # step navigation for components whose circuit reports every gate as 'Step k': undo applies the adjoint of the
+    # last step to the current state (one sweep per gate) instead of restoring a stored state, redo applies it again;
+    # the undone steps are kept in self.redo_steps until a new gate is applied
+    def undo(self):
+        reports = self.qc.reports
+        if len(reports) == 0:
+            return False
+
+        name = f'Step {len(reports)}'
+        # everything that can fail comes before the history changes
+        previous, transformations, count = reports.entries[name]
+        inverse = self.qc.inverse(transformations).transformations
+        state = self.qc.evolve(reports.end_state(name), inverse)
+
+        reports.pop(name)
+        self.qc.transformations = self.qc.transformations[:count - len(transformations)]
+        if previous is not None:
+            reports.store(previous, state)
+        self.redo_steps.append(transformations)
+        return True
+
+    def redo(self):
+        if len(self.redo_steps) == 0:
+            return False
+        self.qc.transformations += self.redo_steps.pop()
+        self.qc.report(f'Step {len(self.qc.reports) + 1}')
+        return True
+
+    def jump(self, step):
+        while len(self.qc.reports) > step and self.undo():
+            pass
+        while len(self.qc.reports) < step and self.redo():
+            pass
+        return len(self.qc.reports)
+
+
 class Display(Enum):
     BROWSER = 1
     TERMINAL = 2
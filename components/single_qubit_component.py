@@ -3,13 +3,14 @@ from math import pi
 from hume.qiskit.util import hume_to_qiskit
 from hume.simulator.circuit import QuantumCircuit, QuantumRegister
 
-from components.common import arg_gates, add_gate, Display, state_table_to_string
+from components.common import Steps, arg_gates, add_gate, Display, state_table_to_string
 
 
-class SingleQubit():
+class SingleQubit(Steps):
 
     def __init__(self, display=Display.BROWSER):
         self.display = display
+        self.redo_steps = []
         self.qc = QuantumCircuit(QuantumRegister(1))
 
     def apply_gate(self, gate, angle=None, report=True):
@@ -19,12 +20,14 @@ class SingleQubit():
         add_gate(self.qc, [], 0, gate, angle if gate in arg_gates else None)
         if report:
             self.qc.report(f'Step {len(self.qc.reports) + 1}')
+            # a new gate starts a new branch
+            self.redo_steps = []
 
     def get_state(self):
         if not self.qc.reports:
             state = self.qc.state
         else:
-            state = self.qc.reports[f'Step {len(self.qc.reports)}'][2]
+            state = self.qc.reports.end_state(f'Step {len(self.qc.reports)}')
 
         print(state_table_to_string(state, display=Display.TERMINAL))
         if self.display == Display.TERMINAL:
@@ -42,6 +45,7 @@ class SingleQubit():
         return ('The circuit is shown by the system.', qc_str)
 
     def reset(self):
+        self.redo_steps = []
         self.qc = QuantumCircuit(QuantumRegister(1))
 
     def last_step(self):
@@ -2,15 +2,29 @@ from collections import Counter
 from math import log2
 
 import qiskit
+from qiskit.circuit.library import UnitaryGate
 
 from hume.simulator.circuit import Swap
+from hume.simulator.parameter import Parameter
 from hume.utils.common import print_state_table, all_close
 from hume.utils.matrix import as_array
 
 
+def qiskit_angle(arg, parameters):
+    # unbound angles become expressions of qiskit parameters, one per name
+    if not isinstance(arg, Parameter):
+        return arg
+    if arg.name not in parameters:
+        parameters[arg.name] = qiskit.circuit.Parameter(arg.name)
+    p = parameters[arg.name]
+    p = p if arg.scale == 1 else arg.scale * p
+    return p if arg.offset == 0 else p + arg.offset
+
+
 def hume_to_qiskit(regs, transformations):
     qs = [qiskit.QuantumRegister(size, 'q' if len(regs) == 1 else None) for size in regs]
     qc = qiskit.QuantumCircuit(*qs)
+    parameters = {}
 
     for tr in transformations:
         if isinstance(tr, Swap):
@@ -20,7 +34,10 @@ def hume_to_qiskit(regs, transformations):
             U = tr.gate
             assert (U.shape[0] == U.shape[1])
             m = int(log2(U.shape[0]))
-            qc.unitary(U, [i + tr.target for i in range(m)])
+            if len(tr.controls) == 0:
+                qc.unitary(U, [i + tr.target for i in range(m)])
+            else:
+                qc.append(UnitaryGate(U).control(len(tr.controls)), tr.controls + [i + tr.target for i in range(m)])
             continue
 
         prefix = ''
@@ -32,6 +49,7 @@ def hume_to_qiskit(regs, transformations):
         m = getattr(qc, prefix + tr.name)
         cs = tr.controls
 
+        arg = qiskit_angle(tr.arg, parameters)
         t = tr.target
         reg = 0
         while t >= regs[reg]:
@@ -39,18 +57,18 @@ def hume_to_qiskit(regs, transformations):
             reg = reg + 1
 
         if len(cs) == 0:
-            if tr.arg is None:
+            if arg is None:
                 m(qs[reg][t])
             else:
-                m(tr.arg, qs[reg][t])
+                m(arg, qs[reg][t])
         elif len(cs) == 1:
-            if tr.arg:
-                m(tr.arg, cs[0], qs[reg][t])
+            if arg is not None:
+                m(arg, cs[0], qs[reg][t])
             else:
                 m(cs[0], qs[reg][t])
         else:
-            if tr.arg:
-                m(tr.arg, cs, qs[reg][t])
+            if arg is not None:
+                m(arg, cs, qs[reg][t])
             else:
                 m(cs, qs[reg][t])
 
@@ -0,0 +1,30 @@
+import time
+from math import ceil, log2
+
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+
+
+def hadamard_qft(n):
+    qc = QuantumCircuit(QuantumRegister(n))
+    for i in range(n):
+        qc.h(i)
+    qc.qft(range(n))
+    return qc
+
+
+def benchmark_sharded(n=22, processes=(1, 2, 4, 8)):
+    print(f'\n{n} qubits, Hadamard layer + QFT')
+    print('processes  global qubits  seconds  speedup')
+    base = None
+    for p in processes:
+        qc = hadamard_qft(n)
+
+        start = time.time()
+        qc.run_sharded(p)
+        elapsed = time.time() - start
+        base = base or elapsed
+        print(f'{p:9}  {min(ceil(log2(p)), n - 1):13}  {elapsed:7.2f}  {base / elapsed:7.2f}')
+
+
+if __name__ == "__main__":
+    benchmark_sharded()
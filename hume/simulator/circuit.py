@@ -1,7 +1,23 @@
 from math import pi
 
 from hume.simulator.gates import *
-from hume.simulator.core import transform, init_state, c_transform, mc_transform, measure, transform_u, c_transform_u
+import numpy as np
+
+from hume.simulator.core import transform, init_state, c_transform, mc_transform, transform_u, c_transform_u, \
+    mc_transform_u, transform_qubits, is_diagonal, d_transform, transform_phases, normalize, swap_qubits, num_qubits, \
+    sample, draw, as_counts, pauli_expectation, expectation, marginal_probabilities, most_likely
+from hume.simulator.fusion import fuse, Fused, merge_diagonals, Diagonal, FUSION_QUBITS
+from hume.simulator.plan import compile_plan, bind_transformation
+from hume.simulator.sparse import execute as execute_sparse
+from hume.simulator.parameter import rotation
+from hume.simulator.sharded import run_sharded
+from hume.simulator.memmap import MappedState
+from hume.simulator.reports import Reports
+from hume.simulator.observer import Observer
+from hume.simulator.stabilizer import clifford_prefix, from_state, simulate, STABILIZER_QUBITS
+from hume.simulator.mps import simulate as simulate_mps
+from hume.simulator.noise import simulate as simulate_noise
+from hume.simulator.optimizer import optimize
 from hume.utils.matrix import dagger
 
 
@@ -55,7 +71,7 @@ class QuantumTransformation:
 
 
 class QuantumCircuit:
-    def __init__(self, *args):
+    def __init__(self, *args, threads=1, dtype=np.complex128, renormalize=0):
         bits = 0
         regs = []
         for register in args:
@@ -63,14 +79,67 @@ class QuantumCircuit:
             bits += register.size
             regs.append(register.size)
 
-        self.state = init_state(bits)
+        # np.complex64 halves memory and bandwidth, renormalize every this many sweeps limits the drift (0 = never)
+        self.dtype = dtype
+        self.renormalize = renormalize
+        # allocated on first use, so that circuits too large for a dense state can be built for tableau and mps
+        self.dense_state = None
         self.transformations = []
         self.regs = regs
         self.num_qubits = sum(self.regs)
-        self.reports = {}
+        self.reports = Reports(lambda: init_state(sum(self.regs), self.dtype), self.evolve)
+        # merge gates on small qubit neighbourhoods before run (see fusion.fuse): True or False, None for states of
+        # at least FUSION_QUBITS qubits only
+        self.fusion = None
+        self.fusion_report = None
+        # gate counts of the last optimize
+        self.optimizer_report = None
+        # gates on large states are split into chunks that run on a pool of this many threads
+        self.threads = threads
+        # state vector backed by a memory mapped file, see initialize_memmap
+        self.mapped = None
+        # last plan from compile
+        self.compiled = None
+        # values of the circuit parameters, see bind
+        self.values = {}
+        # last result of to_unitary
+        self.cached_unitary = None
+        # see observe
+        self.observers = []
+        # run keeps states with few nonzero amplitudes sparse, see sparse.execute
+        self.sparse = True
+        # run starts with a stabilizer tableau while the gates are Clifford (see stabilizer.py): True or False, None
+        # for states of at least STABILIZER_QUBITS qubits only
+        self.stabilizer = None
+        # with a noise model (see noise.NoiseModel) measure averages this many noisy trajectories
+        self.noise = None
+        self.trajectories = 100
+
+    @property
+    def state(self):
+        if self.dense_state is None:
+            self.dense_state = init_state(self.num_qubits, self.dtype)
+        return self.dense_state
+
+    @state.setter
+    def state(self, state):
+        self.dense_state = state
 
     def initialize(self, state):
-        self.state = state
+        self.state = np.asarray(state, dtype=self.dtype)
+
+    def initialize_memmap(self, path, block_qubits=20, resume=False, state=None):
+        # with resume=True, rebuild the same circuit and run it again to continue after a crash
+        self.mapped = MappedState(path, self.num_qubits, block_qubits, self.dtype, resume, state)
+        self.state = self.mapped.state
+
+    def bind(self, values):
+        # values of named parameters (hume.simulator.parameter.Parameter) for the next run, the compiled plan is kept
+        self.values = {**self.values, **values}
+        return self
+
+    def bound_transformations(self):
+        return [bind_transformation(tr, self.values) for tr in self.transformations]
 
     def x(self, t):
         self.transformations.append(QuantumTransformation(x, t, [], 'x'))
@@ -85,16 +154,16 @@ class QuantumCircuit:
         self.transformations.append(QuantumTransformation(h, t, [], 'h'))
 
     def p(self, theta, t):
-        self.transformations.append(QuantumTransformation(phase(theta), t, [], 'p', theta))
+        self.transformations.append(QuantumTransformation(rotation('p', theta), t, [], 'p', theta))
 
     def rx(self, theta, t):
-        self.transformations.append(QuantumTransformation(rx(theta), t, [], 'rx', theta))
+        self.transformations.append(QuantumTransformation(rotation('rx', theta), t, [], 'rx', theta))
 
     def ry(self, theta, t):
-        self.transformations.append(QuantumTransformation(ry(theta), t, [], 'ry', theta))
+        self.transformations.append(QuantumTransformation(rotation('ry', theta), t, [], 'ry', theta))
 
     def rz(self, theta, t):
-        self.transformations.append(QuantumTransformation(rz(theta), t, [], 'rz', theta))
+        self.transformations.append(QuantumTransformation(rotation('rz', theta), t, [], 'rz', theta))
 
     def cx(self, c, t):
         self.transformations.append(QuantumTransformation(x, t, [c], 'x'))
@@ -106,77 +175,252 @@ class QuantumCircuit:
         self.transformations.append(QuantumTransformation(z, t, [c], 'z'))
 
     def cp(self, theta, c, t):
-        self.transformations.append(QuantumTransformation(phase(theta), t, [c], 'p', theta))
+        self.transformations.append(QuantumTransformation(rotation('p', theta), t, [c], 'p', theta))
 
     def cry(self, theta, c, t):
-        self.transformations.append(QuantumTransformation(ry(theta), t, [c], 'ry', theta))
+        self.transformations.append(QuantumTransformation(rotation('ry', theta), t, [c], 'ry', theta))
 
     def mcx(self, cs, t):
         self.transformations.append(QuantumTransformation(x, t, cs, 'x'))
 
     def mcp(self, theta, cs, t):
-        self.transformations.append(QuantumTransformation(phase(theta), t, cs, 'p', theta))
+        self.transformations.append(QuantumTransformation(rotation('p', theta), t, cs, 'p', theta))
 
-    def measure(self, shots=0):
+    def measure(self, shots=0, register=None, seed=None):
+        # register (a QuantumRegister or a list of qubits) samples only those qubits, bit i of an outcome is register[i]
+        if self.noise is not None:
+            return self.measure_noisy(shots, register, seed)
         state = self.run()
-        samples = measure(state, shots)
-        return {'state vector': state, 'counts': samples}
+        qubits = None if register is None else list(register[:])
+        if self.mapped is None:
+            histogram = sample(state, shots, qubits, seed)
+        else:
+            histogram = self.mapped.sample(shots, qubits, seed)
+        return {'state vector': state, 'counts': as_counts(histogram), 'histogram': histogram}
+
+    def measure_noisy(self, shots=0, register=None, seed=None, processes=1):
+        # shots drawn from the outcome probabilities averaged over self.trajectories noisy trajectories, 'standard
+        # error' is the one of those probabilities; the circuit and its state are left alone
+        qubits = None if register is None else list(register[:])
+        rng = np.random.default_rng(seed)
+        p, error = simulate_noise(self.bound_transformations(), self.noise, self.state, self.trajectories, qubits,
+                                  int(rng.integers(2 ** 32)), processes)
+        histogram = draw(p, shots, rng)
+        return {'counts': as_counts(histogram), 'histogram': histogram, 'probabilities': p, 'standard error': error}
+
+    # observables of the state after run, computed from the amplitudes without sampling;
+    # a register is a QuantumRegister or a list of qubits, bit i of its value is register[i]
+
+    def pauli_expectation(self, pauli):
+        return pauli_expectation(self.run(), pauli)
+
+    def expectation(self, values, register=None):
+        return expectation(self.run(), values, None if register is None else list(register[:]))
+
+    def marginal(self, register):
+        return marginal_probabilities(self.run(), list(register[:]))
+
+    def most_likely(self, register=None, signed=False):
+        return most_likely(self.run(), None if register is None else list(register[:]), signed)
 
     def report(self, name=None):
-        start_state = init_state(sum(self.regs))
-        tr_count = 0
-        for report in self.reports.values():
-            if report[3] > tr_count:
-                tr_count = report[3]
-                start_state = report[2]
-
-        qc = QuantumCircuit()
-        qc.regs = self.regs.copy()
-        qc.initialize(start_state.copy())
-        qc.transformations = self.transformations[tr_count:].copy()
-        end_state = qc.run()
+        # see Reports for the memory budget (reports.budget) and the checkpoint interval (reports.every)
+        previous = self.reports.latest()
+        tr_count = 0 if previous is None else self.reports.entries[previous][2]
+        transformations = self.transformations[tr_count:].copy()
 
         if name is None:
             name = len(self.reports)
-        report = (start_state, self.transformations[tr_count:len(self.transformations)].copy(), end_state,
-                  len(self.transformations))
-        self.reports[name] = report
-        return report
+        self.reports.add(name, previous, transformations, len(self.transformations),
+                         self.evolve(self.reports.end_state(previous), transformations))
+        return self.reports[name]
+
+    def evolve(self, state, transformations):
+        qc = QuantumCircuit(threads=self.threads, dtype=self.dtype, renormalize=self.renormalize)
+        qc.fusion = self.fusion
+        qc.values = self.values
+        qc.regs = self.regs.copy()
+        qc.initialize(state.copy())
+        qc.transformations = transformations.copy()
+        return qc.run()
+
+    def optimize(self, window=64):
+        # peephole pass (see optimizer.optimize) over the transformations after the latest report,
+        # the reported ones stay as they are
+        previous = self.reports.latest()
+        start = 0 if previous is None else self.reports.entries[previous][2]
+        optimized, self.optimizer_report = optimize(self.transformations[start:], window)
+        self.transformations = self.transformations[:start] + optimized
+        return self.optimizer_report
+
+    def fuses(self, n):
+        return n >= FUSION_QUBITS if self.fusion is None else self.fusion
+
+    def hands_off(self, n):
+        return n >= STABILIZER_QUBITS if self.stabilizer is None else self.stabilizer
+
+    def compile(self):
+        # the plan leaves the circuit and its state alone and is reused as long as the transformations stay the same
+        n = num_qubits(self.state)
+        key = (n, self.fuses(n), self.dtype)
+        if self.compiled is not None:
+            cached_key, cached, plan = self.compiled
+            if cached_key == key and len(cached) == len(self.transformations) and \
+                    all(a is b for (a, b) in zip(cached, self.transformations)):
+                return plan
+
+        plan = compile_plan(self.transformations, n, key[1], self.dtype)
+        self.compiled = (key, self.transformations.copy(), plan)
+        return plan
 
     def run(self):
-        for tr in self.transformations:
-            self.apply_transformation(tr)
+        if self.mapped is not None:
+            transformations = self.bound_transformations()
+            if self.fuses(self.num_qubits):
+                transformations, self.fusion_report = fuse(merge_diagonals(transformations))
+                self.fusion_report['gates'] = len(self.transformations)
+                self.fusion_report['fused'] = len(self.transformations) - len(transformations)
+            self.mapped.run(transformations)
+            self.state = self.mapped.read()
+            self.transformations = []
+            return self.state
+
+        if self.observers:
+            # observers see every transformation, so they are applied one by one in logical qubit order
+            transformations = self.bound_transformations()
+            for (k, tr) in enumerate(transformations):
+                self.apply_transformation(tr)
+                renormalized = self.renormalize_after(k + 1)
+                for observer in self.observers:
+                    observer.notify(k + 1, tr, self.state, k + 1 == len(transformations), renormalized)
+            self.transformations = []
+            return self.state
+
+        if self.state.ndim == 1 and self.hands_off(num_qubits(self.state)):
+            self.run_clifford_prefix()
+
+        plan = self.compile().bind(self.values)
+        if plan.report is not None:
+            self.fusion_report = dict(plan.report)
+        if self.sparse and self.state.ndim == 1:
+            execute_sparse(plan, self.state, self.threads, self.renormalize)
+        else:
+            plan.execute(self.state, self.threads, self.renormalize)
+        self.transformations = []
+        return self.state
+
+    def run_clifford_prefix(self):
+        # a Clifford prefix longer than the number of qubits runs on a tableau from a basis state, the rest of the
+        # circuit on the dense state it hands off; the handoff writes the nonzero amplitudes once (about one sweep)
+        # and h costs an O(n^3) elimination on the tableau, so short prefixes stay dense
+        n = num_qubits(self.state)
+        transformations = self.bound_transformations()
+        k = clifford_prefix(transformations)
+        if k <= n:
+            return
+        tableau = from_state(self.state)
+        if tableau is None:
+            return
+        for tr in transformations[:k]:
+            tableau.apply(tr)
+        self.state[...] = tableau.to_state(self.dtype)
+        self.transformations = self.transformations[k:]
+
+    def tableau(self):
+        # stabilizer tableau of a Clifford circuit on a basis state, for sampling without the dense state
+        if self.dense_state is None:
+            return simulate(self.bound_transformations(), self.num_qubits)
+        return simulate(self.bound_transformations(), num_qubits(self.state), self.state)
+
+    def mps(self, max_bond=None, cutoff=1e-12):
+        # matrix product state after the transformations (see mps.MPS), the circuit is left alone;
+        # bonds are capped at max_bond and mps.report tells how much weight the truncations dropped
+        if self.dense_state is None:
+            return simulate_mps(self.bound_transformations(), self.num_qubits, max_bond, cutoff)
+        return simulate_mps(self.bound_transformations(), num_qubits(self.state), max_bond, cutoff, self.state)
+
+    def observe(self, callback, stride=1, values=False):
+        # callback(step) every stride transformations of run, see observer.Step; values=True also hands over
+        # the new amplitudes that the transformations since the previous step could have changed
+        observer = Observer(callback, stride, values)
+        self.observers.append(observer)
+        return observer
+
+    def run_batch(self, states):
+        # rows of a (batch, 2^n) array evolve together, one sweep per gate for the whole batch;
+        # the circuit state and transformations are left alone
+        assert (self.mapped is None)
+        return self.compile().bind(self.values).run(states, self.threads, self.renormalize)
+
+    def to_unitary(self, form='dense'):
+        # matrix of the transformations (the state is not used), cached while the plan and the bindings are the same
+        plan = self.compile()
+        if self.cached_unitary is None or self.cached_unitary[:3] != (plan, self.values, form):
+            self.cached_unitary = (plan, dict(self.values), form, plan.bind(self.values).to_unitary(form, self.threads))
+        return self.cached_unitary[3]
+
+    def sweep(self, values, probabilities=False):
+        # states (or probabilities) for a grid of parameter values, see Plan.sweep
+        assert (self.mapped is None)
+        return self.compile().sweep(values, self.state, self.threads, self.renormalize, probabilities)
+
+    def renormalize_after(self, count):
+        if self.renormalize and count % self.renormalize == 0:
+            normalize(self.state)
+            return True
+        return False
+
+    def run_sharded(self, processes, global_qubits=None):
+        self.state = run_sharded(self, processes, global_qubits)
         self.transformations = []
         return self.state
 
     def run_and_yield(self):
         yield None, self.state
-        for tr in self.transformations:
-            self.apply_transformation(tr)
+        for (k, tr) in enumerate(self.bound_transformations()):
+            if self.mapped is not None:
+                self.mapped.run([tr])
+                self.state = self.mapped.read()
+            else:
+                self.apply_transformation(tr)
+                self.renormalize_after(k + 1)
             yield tr, self.state
         self.transformations = []
 
     def apply_transformation(self, tr):
+        threads = self.threads
+
         if tr.name == 'unitary':
             cs = tr.controls
             if len(cs) == 0:
-                transform_u(self.state, tr.gate, tr.target)
+                transform_u(self.state, tr.gate, tr.target, threads)
             elif len(cs) == 1:
-                c_transform_u(self.state, tr.gate, cs[0], tr.target)
+                c_transform_u(self.state, tr.gate, cs[0], tr.target, threads)
+            else:
+                mc_transform_u(self.state, tr.gate, cs, tr.target, threads)
+
+        elif isinstance(tr, Fused):
+            if len(tr.qubits) == 1 and len(tr.controls) == 0:
+                transform(self.state, tr.qubits[0], tr.gate, threads)
+            else:
+                transform_qubits(self.state, tr.gate, tr.qubits, tr.controls, threads)
+
+        elif isinstance(tr, Diagonal):
+            transform_phases(self.state, tr.phases, tr.qubits, threads)
 
         elif isinstance(tr, Swap):
-            c_transform(self.state, tr.i, tr.j, x)
-            c_transform(self.state, tr.j, tr.i, x)
-            c_transform(self.state, tr.i, tr.j, x)
+            swap_qubits(self.state, tr.i, tr.j)
 
         else:
             cs = tr.controls
-            if len(cs) == 0:
-                transform(self.state, tr.target, tr.gate)
+            if is_diagonal(tr.gate):
+                d_transform(self.state, cs, tr.target, tr.gate, threads)
+            elif len(cs) == 0:
+                transform(self.state, tr.target, tr.gate, threads)
             elif len(cs) == 1:
-                c_transform(self.state, cs[0], tr.target, tr.gate)
+                c_transform(self.state, cs[0], tr.target, tr.gate, threads)
             else:
-                mc_transform(self.state, cs, tr.target, tr.gate)
+                mc_transform(self.state, cs, tr.target, tr.gate, threads)
 
     def swap(self, i, j):
         self.transformations.append(Swap(i, j))
@@ -185,11 +429,13 @@ class QuantumCircuit:
         for j in range(len(targets) // 2):
             self.swap(targets[j], targets[len(targets) - 1 - j])
 
-    def inverse(self):
+    def inverse(self, transformations=None):
+        # adjoint of the circuit, or of a run of its transformations
         qs = [QuantumRegister(size, 'q' if len(self.regs) == 1 else None) for size in self.regs]
         qc = QuantumCircuit(*qs)
 
-        for tr in self.transformations[::-1]:
+        transformations = self.transformations if transformations is None else transformations
+        for tr in transformations[::-1]:
             if isinstance(tr, Swap):
                 qc.swap(tr.i, tr.j)
                 continue
@@ -202,6 +448,9 @@ class QuantumCircuit:
                 elif len(cs) == 1:
                     qc.c_unitary(dagger(tr.gate), cs[0], tr.target)
                     continue
+                else:
+                    qc.mc_unitary(dagger(tr.gate), cs, tr.target)
+                    continue
 
             prefix = ''
             if len(tr.controls) == 1:
@@ -219,12 +468,12 @@ class QuantumCircuit:
                 reg = reg + 1
 
             if len(cs) == 0:
-                if tr.arg:
+                if tr.arg is not None:
                     m(-tr.arg, qs[reg][t])
                 else:
                     m(qs[reg][t])
             elif len(cs) == 1:
-                if tr.arg:
+                if tr.arg is not None:
                     m(-tr.arg, cs[0], qs[reg][t])
                 else:
                     m(cs[0], qs[reg][t])
@@ -293,6 +542,13 @@ class QuantumCircuit:
         assert (U.shape[0] == U.shape[1] == 2 ** q.size)
         self.c_unitary(U, c, q.shift)
 
+    def mc_unitary(self, U, cs, t):
+        self.transformations.append(QuantumTransformation(U, t, cs, 'unitary'))
+
+    def mc_append_u(self, U, cs, q):
+        assert (U.shape[0] == U.shape[1] == 2 ** q.size)
+        self.mc_unitary(U, cs, q.shift)
+
 
 class QFT(QuantumCircuit):
     def __init__(self, m, reversed=False, swap=True):
@@ -1,6 +1,8 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
 from math import log2, ceil, floor
-from random import choices
-from collections import Counter
+
+import numpy as np
 
 from hume.utils.common import is_close
 
@@ -10,14 +12,14 @@ def is_power_of_two(m):
 
 
 def prepare_state(*a):
-    state = [a[k] for k in range(len(a))]
+    state = np.array(a, dtype=complex)
     assert (is_power_of_two(len(state)))
-    assert (is_close(sum([abs(state[k]) ** 2 for k in range(len(state))]), 1.0))
+    assert (is_close(float(np.vdot(state, state).real), 1.0))
     return state
 
 
-def init_state(n):
-    state = [0 for _ in range(2 ** n)]
+def init_state(n, dtype=complex):
+    state = np.zeros(2 ** n, dtype=dtype)
     state[0] = 1
     return state
 
@@ -59,6 +61,65 @@ def pair_generator_pattern(n, t):
 pair_generator = pair_generator_concatenate
 
 
+def in_place(kernel):
+    # kernels work on a contiguous complex array; lists and strided views are copied in and written back
+    @wraps(kernel)
+    def wrapper(state, *args, **kwargs):
+        if isinstance(state, np.ndarray) and state.flags.c_contiguous and np.iscomplexobj(state):
+            return kernel(state, *args, **kwargs)
+
+        dtype = state.dtype if isinstance(state, np.ndarray) and np.iscomplexobj(state) else complex
+        vec = np.array(state, dtype=dtype)
+        result = kernel(vec, *args, **kwargs)
+        state[:] = vec if isinstance(state, np.ndarray) else vec.tolist()
+        return result
+
+    return wrapper
+
+
+def num_qubits(state):
+    return int(log2(state.shape[-1]))
+
+
+def as_gate(gate, dtype=complex):
+    return np.asarray(gate, dtype=dtype)
+
+
+def pair_view(state, t):
+    # axes: (batch, prefix, target bit, suffix); leading axes of the state are treated as a batch
+    n = num_qubits(state)
+    return state.reshape(-1, 2 ** (n - t - 1), 2, 2 ** t)
+
+
+def control_mask(cs):
+    mask = 0
+    for c in cs:
+        mask |= 1 << c
+    return mask
+
+
+# states with fewer amplitudes are not worth splitting across threads
+PARALLEL_SIZE = 2 ** 16
+
+thread_pools = {}
+
+
+def thread_pool(threads):
+    if threads not in thread_pools:
+        thread_pools[threads] = ThreadPoolExecutor(threads)
+    return thread_pools[threads]
+
+
+def for_chunks(f, count, threads, size):
+    # f is called on disjoint slices covering range(count)
+    if threads <= 1 or count < 2 or size < PARALLEL_SIZE:
+        f(slice(0, count))
+        return
+
+    bounds = np.linspace(0, count, min(threads, count) + 1).astype(int)
+    list(thread_pool(threads).map(f, [slice(a, b) for (a, b) in zip(bounds[:-1], bounds[1:])]))
+
+
 def process_pair(state, gate, k0, k1):
     x = state[k0]
     y = state[k1]
@@ -67,74 +128,287 @@ def process_pair(state, gate, k0, k1):
     state[k1] = x * gate[1][0] + y * gate[1][1]
 
 
-def transform(state, t, gate):
-    n = int(log2(len(state)))
-    for (k0, k1) in pair_generator(n, t):
-        process_pair(state, gate, k0, k1)
+def entry(gate, i, j, ndim):
+    # a gate with a leading axis holds one matrix per state of the batch, which is axis 0 of every view
+    if gate.ndim == 2:
+        return gate[i, j]
+    return gate[:, i, j].reshape((-1,) + (1,) * (ndim - 1))
+
+
+def update_pairs(a, b, gate):
+    # ufunc arithmetic only, so that chunks running on a thread pool release the GIL
+    x = a * entry(gate, 0, 0, a.ndim)
+    x += b * entry(gate, 0, 1, a.ndim)
+    b *= entry(gate, 1, 1, a.ndim)
+    b += a * entry(gate, 1, 0, a.ndim)
+    a[...] = x
+
+
+def chunk_pairs(view):
+    # slices of the (batch, prefix, target bit, suffix) view along its longer free axis
+    if view.shape[1] >= view.shape[3]:
+        return lambda s: view[:, s], view.shape[1]
+    return lambda s: view[..., s], view.shape[3]
+
+
+def block_view(state, involved):
+    # the top qubits a gate leaves alone split the state into independent blocks:
+    # (batch, block, 2, ..., 2) where qubit q below the blocks is on axis n - f + 1 - q
+    n = num_qubits(state)
+    f = 0
+    while f < n and n - 1 - f not in involved:
+        f += 1
+    return state.reshape((-1, 2 ** f) + (2,) * (n - f)), n - f
+
+
+def controlled_pairs(state, cs, t):
+    # views of the target 0 and target 1 amplitudes where every control is set: the controls and the target
+    # are fixed on their axes of the block view, no index arrays
+    tensor, n = block_view(state, list(cs) + [t])
+    index = [slice(None)] * (n + 2)
+    for c in cs:
+        index[n + 1 - c] = 1
+    index[n + 1 - t] = 0
+    a = tensor[tuple(index)]
+    index[n + 1 - t] = 1
+    return a, tensor[tuple(index)]
+
+
+def chunk_views(a, b):
+    # slices of both views along their longest axis after the batch
+    axis = 1 + int(np.argmax(a.shape[1:]))
+    before = (slice(None),) * axis
+    return lambda s: (a[before + (s,)], b[before + (s,)]), a.shape[axis]
+
+
+@in_place
+def transform(state, t, gate, threads=1):
+    gate = as_gate(gate, state.dtype)
+    chunk, count = chunk_pairs(pair_view(state, t))
 
+    def sweep(s):
+        v = chunk(s)
+        update_pairs(v[:, :, 0], v[:, :, 1], gate)
 
-def c_transform(state, c, t, gate):
-    n = int(log2(len(state)))
-    for (k0, k1) in filter(lambda p: is_bit_set(p[0], c), pair_generator(n, t)):
-        process_pair(state, gate, k0, k1)
+    for_chunks(sweep, count, threads, state.size)
 
 
-def mc_transform(state, cs, t, gate):
+@in_place
+def c_transform(state, c, t, gate, threads=1):
+    mc_transform(state, [c], t, gate, threads)
+
+
+@in_place
+def mc_transform(state, cs, t, gate, threads=1):
     assert t not in cs
-    n = int(log2(len(state)))
-    for (k0, k1) in filter(lambda p: all([is_bit_set(p[0], c) for c in cs]), pair_generator(n, t)):
-        process_pair(state, gate, k0, k1)
+    chunk, count = chunk_views(*controlled_pairs(state, cs, t))
+    gate = as_gate(gate, state.dtype)
+
+    def sweep(s):
+        a, b = chunk(s)
+        update_pairs(a, b, gate)
+
+    for_chunks(sweep, count, threads, state.size)
+
+
+def is_diagonal(gate):
+    gate = as_gate(gate)
+    return gate.shape[-2:] == (2, 2) and not np.any(gate[..., 0, 1]) and not np.any(gate[..., 1, 0])
+
+
+@in_place
+def d_transform(state, cs, t, gate, threads=1):
+    # diagonal gate: scale the target 0 and target 1 halves in place, skipping a half whose factor is 1
+    gate = as_gate(gate, state.dtype)
+
+    if len(cs) == 0:
+        chunk, count = chunk_pairs(pair_view(state, t))
+
+        def sweep(s):
+            v = chunk(s)
+            if np.any(gate[..., 0, 0] != 1):
+                v[:, :, 0] *= entry(gate, 0, 0, 3)
+            if np.any(gate[..., 1, 1] != 1):
+                v[:, :, 1] *= entry(gate, 1, 1, 3)
+    else:
+        chunk, count = chunk_views(*controlled_pairs(state, cs, t))
+
+        def sweep(s):
+            a, b = chunk(s)
+            if np.any(gate[..., 0, 0] != 1):
+                a *= entry(gate, 0, 0, a.ndim)
+            if np.any(gate[..., 1, 1] != 1):
+                b *= entry(gate, 1, 1, b.ndim)
+
+    for_chunks(sweep, count, threads, state.size)
+
+
+@in_place
+def transform_phases(state, phases, qs, threads=1):
+    # elementwise multiply by a diagonal given on the sorted qubits qs, broadcast over the other qubits
+    tensor, n = block_view(state, qs)
+    shape = [1] * (n + 2)
+    for q in qs:
+        shape[n + 1 - q] = 2
+    # phases with a leading axis hold one diagonal per state of the batch
+    shape[0] = -1 if phases.ndim > 1 else 1
+    phases = phases.astype(state.dtype, copy=False).reshape(shape)
+
+    def sweep(s):
+        tensor[:, s] *= phases
+
+    for_chunks(sweep, tensor.shape[1], threads, state.size)
+
+
+@in_place
+def transform_qubits(state, U, qs, cs=[], threads=1):
+    # bit j of the row/column index of U acts on qubit qs[j], only where every control in cs is set
+    m = len(qs)
+    assert not set(qs) & set(cs)
+    U = as_gate(U, state.dtype)
+    batched = U.ndim > 2
+    U = U.swapaxes(-1, -2) if batched else U.reshape((2,) * (2 * m))
+    tensor, n = block_view(state, list(qs) + list(cs))
+
+    # fixing the control axes to 1 leaves a view on the controlled subspace
+    index = [slice(None)] * (n + 2)
+    for c in cs:
+        index[n + 1 - c] = 1
+    axes = [n + 1 - q - len([c for c in cs if c > q]) for q in qs[::-1]]
+
+    def sweep(s):
+        sub = tensor[:, s][tuple(index)]
+        if batched:
+            # one matrix per state: the target axes go last and each state is multiplied by its own U^T
+            moved = np.moveaxis(sub, axes, list(range(-m, 0)))
+            out = moved.reshape(len(U), -1, 2 ** m) @ U
+            sub[...] = np.moveaxis(out.reshape(moved.shape), list(range(-m, 0)), axes)
+            return
+        out = np.tensordot(U, sub, axes=(list(range(m, 2 * m)), axes))
+        sub[...] = np.moveaxis(out, list(range(m)), axes)
+
+    for_chunks(sweep, tensor.shape[1], threads, state.size)
 
 
-def measure(state, shots):
-    samples = choices(range(len(state)), [abs(state[k]) ** 2 for k in range(len(state))], k=shots)
-    counts = {}
-    for (k, v) in Counter(samples).items():
-        counts[k] = v
-    return counts
+@in_place
+def swap_qubits(state, i, j):
+    # exchange the amplitudes with bits (i, j) = (1, 0) and (0, 1), the other half stays in place
+    a, _ = controlled_pairs(state, [i], j)
+    b, _ = controlled_pairs(state, [j], i)
+    tmp = a.copy()
+    a[...] = b
+    b[...] = tmp
 
 
-def transform_u(state, U, t):
-    assert (U.shape[0] == U.shape[1])
-    m = int(log2(U.shape[0]))
-    n = int(log2(len(state)))
+@in_place
+def permute_qubits(state, perm):
+    # logical qubit q is stored at physical position perm[q]; reorder the index bits into logical order
+    n = num_qubits(state)
+    tensor = state.reshape((-1,) + (2,) * n)
+    axes = [0] + [n - perm[n - a] for a in range(1, n + 1)]
+    state[...] = tensor.transpose(axes).reshape(state.shape)
+
+
+def probabilities(state):
+    # accumulated in double precision also for single precision states
+    return np.abs(state).astype(float) ** 2
+
+
+def normalize(state):
+    state /= np.sqrt(np.sum(probabilities(state), axis=-1, keepdims=True)).astype(state.real.dtype)
+
+
+def marginal_probabilities(state, qubits):
+    # probabilities of the values of qubits (bit i of an outcome is qubits[i]), summed over the other qubits
+    # (leading batch axes are kept)
+    p = probabilities(state)
+    n = num_qubits(p)
+    batch = p.ndim - 1
+    tensor = p.reshape(p.shape[:-1] + (2,) * n)
+    others = tuple(batch + n - 1 - q for q in range(n) if q not in qubits)
+    kept = sorted(qubits, reverse=True)
+    order = list(range(batch)) + [batch + kept.index(q) for q in qubits[::-1]]
+    return tensor.sum(axis=others).transpose(order).reshape(p.shape[:-1] + (-1,))
+
+
+def pauli_expectation(state, pauli):
+    # pauli: a string like 'XIZY' (last character on qubit 0) or a dict {qubit: 'X'}
+    # P|k> = i^#Y (-1)^(bits of k under Z and Y) |k ^ (bits under X and Y)>, so <P> pairs every amplitude
+    # with the flipped one: one pass over the state, no index arrays
+    if isinstance(pauli, str):
+        pauli = {q: c for (q, c) in enumerate(pauli[::-1])}
+    state = np.asarray(state)
+    n = num_qubits(state)
+    tensor = state.reshape((2,) * n)
+    flipped = np.flip(tensor, axis=tuple(n - 1 - q for (q, c) in pauli.items() if c in 'XY'))
+    signed = tensor.copy()
+    for (q, c) in pauli.items():
+        if c in 'ZY':
+            index = [slice(None)] * n
+            index[n - 1 - q] = 1
+            signed[tuple(index)] *= -1
+    ys = len([c for c in pauli.values() if c == 'Y'])
+    return (1j ** ys * np.vdot(flipped, signed)).real
+
+
+def expectation(state, values, qubits=None):
+    # diagonal observable: values[k] for outcome k of the qubits (all qubits by default)
+    p = probabilities(state) if qubits is None else marginal_probabilities(state, qubits)
+    return float(np.dot(p, values))
+
+
+def signed_value(k, m):
+    # m-bit register value read as two's complement
+    return k - 2 ** m if k >= 2 ** (m - 1) else k
 
-    vec = [_ for _ in range(2 ** m)]
 
-    for suffix in range(2 ** t):
-        for prefix in range(2 ** (n - m - t)):
-            for target in range(2 ** m):
-                k = prefix * 2 ** (t + m) + target * 2 ** t + suffix
-                vec[target] = state[k]
+def most_likely(state, qubits=None, signed=False):
+    p = probabilities(state) if qubits is None else marginal_probabilities(state, qubits)
+    k = int(np.argmax(p))
+    return signed_value(k, num_qubits(p)) if signed else k
+
+
+def draw(p, shots, seed=None):
+    # histogram of shots over the outcomes, as np.bincount would give it; one multinomial draw
+    # instead of drawing and hashing every shot (seed may also be a np.random.Generator)
+    return np.random.default_rng(seed).multinomial(shots, p / p.sum())
+
+
+def as_counts(histogram):
+    return {int(k): int(histogram[k]) for k in np.flatnonzero(histogram)}
+
+
+def bits_histogram(bits):
+    # histogram of (shots, m) outcome bits like sample gives it, bit i of an outcome is column i
+    return np.bincount(bits.astype(np.int64) @ (1 << np.arange(bits.shape[1])), minlength=2 ** bits.shape[1])
+
+
+def bits_counts(bits):
+    # {outcome: count} of (shots, m) outcome bits for any m (the outcomes are python ints)
+    outcomes, counts = np.unique(bits, axis=0, return_counts=True)
+    return {sum(1 << int(i) for i in np.flatnonzero(o)): int(c) for (o, c) in zip(outcomes, counts)}
+
+
+def sample(state, shots, qubits=None, seed=None):
+    p = probabilities(state) if qubits is None else marginal_probabilities(state, qubits)
+    return draw(p, shots, seed)
+
+
+def measure(state, shots, qubits=None, seed=None):
+    return as_counts(sample(state, shots, qubits, seed))
+
+
+def transform_u(state, U, t, threads=1):
+    assert (U.shape[0] == U.shape[1])
+    m = int(log2(U.shape[0]))
+    transform_qubits(state, U, list(range(t, t + m)), [], threads)
 
-            vec_out = U @ vec
 
-            for target in range(2 ** m):
-                k = prefix * 2 ** (t + m) + target * 2 ** t + suffix
-                state[k] = vec_out[target]
+def c_transform_u(state, U, c, t, threads=1):
+    mc_transform_u(state, U, [c], t, threads)
 
 
-def c_transform_u(state, U, c, t):
+def mc_transform_u(state, U, cs, t, threads=1):
     assert (U.shape[0] == U.shape[1])
     m = int(log2(U.shape[0]))
-    n = int(log2(len(state)))
-
-    vec = [_ for _ in range(2 ** m)]
-
-    for suffix in range(2 ** t):
-        for prefix in range(2 ** (n - m - t)):
-            targets = []
-            for idx in range(2 ** m):
-                k = prefix * 2 ** (t + m) + idx * 2 ** t + suffix
-                if k & (1 << c):
-                    # if is_bit_set(k, c):
-                    vec[idx] = state[k]
-                    targets.append(k)
-
-            vec_out = U @ vec
-
-            for idx in range(2 ** m):
-                k = prefix * 2 ** (t + m) + idx * 2 ** t + suffix
-                # if k & (1 << c):
-                if is_bit_set(k, c):
-                    state[k] = vec_out[idx]
+    transform_qubits(state, U, list(range(t, t + m)), cs, threads)
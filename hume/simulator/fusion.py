@@ -0,0 +1,187 @@
+from copy import copy
+
+import numpy as np
+
+from hume.simulator.core import transform_qubits, as_gate, is_diagonal
+
+# on smaller states building the fused matrices costs more than the sweeps it saves
+FUSION_QUBITS = 14
+
+
+class Fused:
+    def __init__(self, gate, qubits, count, controls=[], sources=[]):
+        self.name = 'fused'
+        self.gate = gate
+        self.qubits = qubits
+        self.count = count
+        self.controls = controls
+        # transformations multiplied into gate
+        self.sources = sources
+
+    def __str__(self):
+        return f'fused {self.count} {self.controls} {self.qubits}'
+
+
+class Diagonal:
+    def __init__(self, phases, qubits, count, sources=[]):
+        self.name = 'diagonal'
+        self.phases = phases
+        self.qubits = qubits
+        self.count = count
+        self.sources = sources
+
+    def __str__(self):
+        return f'diagonal {self.count} {self.qubits}'
+
+
+def transformation_matrix(tr):
+    # matrix of a transformation together with the qubits its index bits act on (bit j on qubits[j])
+    if tr.name == 'swap':
+        return np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=complex), [tr.i, tr.j]
+
+    if tr.name == 'diagonal':
+        return np.diag(tr.phases), tr.qubits
+
+    U = as_gate(tr.gate)
+    m = len(targets(tr))
+
+    # controls are the high bits, so the controlled block is the bottom right corner
+    M = np.eye(2 ** (m + len(tr.controls)), dtype=complex)
+    M[-2 ** m:, -2 ** m:] = U
+    return M, targets(tr) + list(tr.controls)
+
+
+def targets(tr):
+    if tr.name == 'fused':
+        return list(tr.qubits)
+    if tr.name == 'unitary':
+        return [tr.target + j for j in range(int(np.log2(len(tr.gate))))]
+    return [tr.target]
+
+
+def embed(U, qs, support):
+    # rows of the identity are basis states, transformed as a batch they give the transposed matrix
+    rows = np.eye(2 ** len(support), dtype=complex)
+    transform_qubits(rows, U, [support.index(q) for q in qs])
+    return rows.T
+
+
+def support(tr):
+    if tr.name == 'swap':
+        return {tr.i, tr.j}
+    if tr.name == 'diagonal':
+        return set(tr.qubits)
+    return set(targets(tr) + list(tr.controls))
+
+
+def relabel(transformations, n):
+    # swaps only exchange entries of the logical to physical qubit map, the other transformations are moved to
+    # the physical positions; the final map is returned so that the state can be reordered once at the end
+    perm = list(range(n))
+    relabeled = []
+
+    for tr in transformations:
+        if tr.name == 'swap':
+            perm[tr.i], perm[tr.j] = perm[tr.j], perm[tr.i]
+            continue
+
+        if tr.name == 'unitary':
+            # the physical targets need not be contiguous any more
+            relabeled.append(Fused(tr.gate, [perm[q] for q in targets(tr)], 1, [perm[c] for c in tr.controls]))
+            continue
+
+        tr = copy(tr)
+        tr.target = perm[tr.target]
+        tr.controls = [perm[c] for c in tr.controls]
+        relabeled.append(tr)
+
+    return relabeled, perm
+
+
+def expand_phases(phases, qs, support):
+    # phases on the sorted qubits qs, broadcast to the sorted qubits in support
+    shape = [1] * len(support)
+    for q in qs:
+        shape[len(support) - 1 - support.index(q)] = 2
+    return np.broadcast_to(phases.reshape(shape), (2,) * len(support)).reshape(-1)
+
+
+def merge_phases(run):
+    qubits = sorted(set().union(*[support(tr) for tr in run]))
+    phases = np.ones(2 ** len(qubits), dtype=complex)
+    for tr in run:
+        qs = sorted(support(tr))
+        # only the two entries with every control set differ from 1
+        d = np.ones(2 ** len(qs), dtype=complex)
+        d[[(1 << len(qs)) - 1 - (1 << qs.index(tr.target)), -1]] = np.diag(as_gate(tr.gate))
+        phases *= expand_phases(d, qs, qubits)
+    return Diagonal(phases, qubits, len(run), run)
+
+
+def merge_diagonals(transformations, max_qubits=10):
+    # consecutive diagonal gates on few qubits multiply into one phase vector, applied in one sweep
+    merged = []
+    run = []
+
+    def close():
+        if len(run) == 1:
+            merged.append(run[0])
+        elif len(run) > 1:
+            merged.append(merge_phases(run.copy()))
+        run.clear()
+
+    for tr in transformations:
+        if tr.name in ['swap', 'unitary', 'fused'] or len(tr.controls) > 1 or not is_diagonal(tr.gate):
+            close()
+            merged.append(tr)
+            continue
+
+        if len(set().union(support(tr), *[support(r) for r in run])) > max_qubits:
+            close()
+        run.append(tr)
+
+    close()
+    return merged
+
+
+def merge(transformations):
+    if len(transformations) == 1:
+        return transformations[0]
+
+    qubits = sorted(set().union(*[support(tr) for tr in transformations]))
+    U = np.eye(2 ** len(qubits), dtype=complex)
+    for tr in transformations:
+        M, qs = transformation_matrix(tr)
+        U = embed(M, qs, qubits) @ U
+    return Fused(U, qubits, len(transformations), [], transformations)
+
+
+def fuse(transformations, max_qubits=3):
+    # open blocks have disjoint supports and commute, a gate joins the blocks it touches
+    # while their combined support stays small, otherwise those blocks are closed first
+    fused = []
+    blocks = []
+
+    for tr in transformations:
+        qs = support(tr)
+        touching = [b for b in blocks if b[0] & qs]
+        blocks = [b for b in blocks if not b[0] & qs]
+        merged = qs.union(*[b[0] for b in touching])
+
+        if len(merged) <= max_qubits:
+            blocks.append((merged, [t for b in touching for t in b[1]] + [tr]))
+            continue
+
+        for b in touching:
+            fused.append(merge(b[1]))
+
+        if len(qs) <= max_qubits:
+            blocks.append((qs, [tr]))
+        else:
+            fused.append(tr)
+
+    for b in blocks:
+        fused.append(merge(b[1]))
+
+    report = {'gates': len(transformations), 'sweeps': len(fused), 'fused': len(transformations) - len(fused)}
+    return fused, report
@@ -0,0 +1,149 @@
+import json
+import os
+
+import numpy as np
+
+from hume.simulator.core import probabilities, marginal_probabilities, sample, draw, as_counts
+from hume.simulator.sharded import Shards, apply_local, exchange
+
+
+# The state is an np.memmap file processed one block of 2^block_qubits amplitudes at a time: a batch of gates on
+# qubits inside the blocks is applied to each block while it is in memory, and a gate on a higher qubit first
+# swaps that qubit into the blocks with a blocked transpose of block pairs (see sharded.Shards).
+#
+# Every batch and every transpose is a step, made of segments (a block or a block pair). The original data of a
+# segment goes to a journal before the segment is written back, and the progress file records the next segment.
+# After a crash the same circuit resumes from the file: the steps are replayed without touching the state up to
+# the recorded one, the interrupted segment is restored from the journal and processing continues.
+
+
+def write_json(path, data):
+    with open(path + '.tmp', 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + '.tmp', path)
+
+
+class MappedState(Shards):
+    def __init__(self, path, n, block_qubits=20, dtype=complex, resume=False, state=None):
+        super().__init__(n, n - min(block_qubits, n))
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.size = 2 ** self.local_n
+        self.step = 0
+
+        if resume:
+            self.state = np.memmap(path, dtype=self.dtype, mode='r+', shape=(2 ** n,))
+            with open(path + '.progress') as f:
+                self.done = json.load(f)
+            assert (self.done['n'] == n and self.done['local'] == self.local_n)
+            self.recover()
+        else:
+            for suffix in ['.journal', '.journal.json']:
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+            self.state = np.memmap(path, dtype=self.dtype, mode='w+', shape=(2 ** n,))
+            if state is None:
+                self.state[0] = 1
+            else:
+                for b in range(2 ** self.global_qubits):
+                    self.block(b)[...] = state[b * self.size:(b + 1) * self.size]
+            self.state.flush()
+            self.save_progress(0, 0)
+
+    def block(self, b):
+        return self.state[b * self.size:(b + 1) * self.size]
+
+    def save_progress(self, step, segment):
+        self.done = {'n': self.n, 'local': self.local_n, 'step': step, 'segment': segment}
+        write_json(self.path + '.progress', self.done)
+
+    def write_journal(self, step, segment, blocks, old):
+        with open(self.path + '.journal', 'wb') as f:
+            for data in old:
+                data.tofile(f)
+            f.flush()
+            os.fsync(f.fileno())
+        write_json(self.path + '.journal.json', {'step': step, 'segment': segment, 'blocks': blocks})
+
+    def recover(self):
+        # a segment that was being written when the crash happened gets its original data back
+        if not os.path.exists(self.path + '.journal.json'):
+            return
+        with open(self.path + '.journal.json') as f:
+            journal = json.load(f)
+        if (journal['step'], journal['segment']) != (self.done['step'], self.done['segment']):
+            return
+
+        old = np.fromfile(self.path + '.journal', dtype=self.dtype).reshape(len(journal['blocks']), self.size)
+        for (b, data) in zip(journal['blocks'], old):
+            self.block(b)[...] = data
+        self.state.flush()
+
+    def process(self, segments, f):
+        step = self.step
+        self.step += 1
+        if step < self.done['step']:
+            return
+
+        start = self.done['segment'] if step == self.done['step'] else 0
+        for i in range(start, len(segments)):
+            blocks = segments[i]
+            old = [np.array(self.block(b)) for b in blocks]
+            self.write_journal(step, i, blocks, old)
+
+            new = [data.copy() for data in old]
+            f(blocks, new)
+            for (b, data) in zip(blocks, new):
+                self.block(b)[...] = data
+            self.state.flush()
+            self.save_progress(step, i + 1)
+
+        self.save_progress(step + 1, 0)
+
+    def apply_ops(self, ops):
+        def f(blocks, data):
+            for op in ops:
+                apply_local(data[0], blocks[0], op, self.local_n)
+
+        self.process([[b] for b in range(2 ** self.global_qubits)], f)
+
+    def exchange_qubit(self, g, l):
+        self.process([[a, b] for (a, b) in self.exchange_pairs(g)], lambda blocks, data: exchange(*data, l))
+
+    def read(self):
+        self.restore()
+        return self.state
+
+    def marginal(self, qubits):
+        # accumulated one block at a time: the local qubits are summed inside the block, the global ones are fixed
+        p = np.zeros(2 ** len(qubits))
+        local = [i for (i, q) in enumerate(qubits) if q < self.local_n]
+        outcomes = np.arange(2 ** len(local))
+        spread = np.zeros_like(outcomes)
+        for (j, i) in enumerate(local):
+            spread |= ((outcomes >> j) & 1) << i
+        for b in range(2 ** self.global_qubits):
+            base = sum(((b >> (q - self.local_n)) & 1) << i for (i, q) in enumerate(qubits) if q >= self.local_n)
+            p[base | spread] += marginal_probabilities(self.block(b), [qubits[i] for i in local])
+        return p
+
+    def sample(self, shots, qubits=None, seed=None):
+        # histogram like core.sample; shots are split over the blocks first, so that only one block of
+        # probabilities is in memory at a time
+        rng = np.random.default_rng(seed)
+        if qubits is not None:
+            return draw(self.marginal(qubits), shots, rng)
+
+        blocks = 2 ** self.global_qubits
+        totals = np.array([probabilities(self.block(b)).sum() for b in range(blocks)])
+        histogram = np.zeros(2 ** self.n, dtype=np.int64)
+        for (b, k) in enumerate(rng.multinomial(shots, totals / totals.sum())):
+            if k > 0:
+                histogram[b * self.size:(b + 1) * self.size] = sample(self.block(b), k, None, rng)
+        return histogram
+
+    def measure(self, shots, qubits=None, seed=None):
+        return as_counts(self.sample(shots, qubits, seed))
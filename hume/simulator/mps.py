@@ -0,0 +1,176 @@
+import numpy as np
+
+from hume.simulator.core import bits_histogram, bits_counts
+from hume.simulator.fusion import transformation_matrix, embed
+
+SWAP = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=complex)
+
+
+def split(theta, max_bond=None, cutoff=1e-12):
+    # theta (left, right) = u @ v with the bond cut to at most max_bond, dropping the smallest singular values as
+    # long as their weight stays under cutoff; returns u, v and the discarded weight
+    u, s, v = np.linalg.svd(theta, full_matrices=False)
+    weights = s ** 2 / np.sum(s ** 2)
+    # tail[k] is the weight dropped by keeping k singular values
+    tail = np.concatenate([np.cumsum(weights[::-1])[::-1], [0]])
+    keep = max(1, int(np.argmax(tail <= cutoff)))
+    if max_bond is not None:
+        keep = min(keep, max_bond)
+    s = s[:keep] / np.sqrt(1 - tail[keep])
+    return u[:, :keep], s[:, None] * v[:keep], float(tail[keep])
+
+
+class MPS:
+    # matrix product state: one tensor (left bond, 2, right bond) per site, logical qubit q at site sites[q]
+    # (swaps only exchange sites); the sites left of center are left canonical and the ones right of it right
+    # canonical, so singular values of a split at the center are Schmidt values and truncation is optimal
+    def __init__(self, n, max_bond=None, cutoff=1e-12, dtype=complex):
+        self.n = n
+        self.max_bond = max_bond
+        self.cutoff = cutoff
+        self.tensors = []
+        for _ in range(n):
+            A = np.zeros((1, 2, 1), dtype=dtype)
+            A[0, 0, 0] = 1
+            self.tensors.append(A)
+        self.sites = list(range(n))
+        self.qubits = list(range(n))
+        self.center = 0
+        # 'discarded': summed weight of the dropped singular values, 'fidelity': product of the kept weights
+        # (an estimate of |<exact|mps>|^2)
+        self.report = {'max bond': 1, 'truncations': 0, 'discarded': 0.0, 'fidelity': 1.0}
+
+    @staticmethod
+    def from_state(state, max_bond=None, cutoff=1e-12):
+        n = int(np.log2(state.size))
+        mps = MPS(n, max_bond, cutoff, state.dtype)
+        # axis j of the reshaped state is bit n-1-j, reversed so that axis j is qubit j
+        rest = np.asarray(state).reshape((2,) * n).transpose(range(n)[::-1]).reshape(1, -1)
+        for j in range(n - 1):
+            left = rest.shape[0]
+            u, rest, discarded = split(rest.reshape(left * 2, -1), max_bond, cutoff)
+            mps.tensors[j] = u.reshape(left, 2, -1)
+            mps.record(discarded)
+        mps.tensors[n - 1] = rest.reshape(rest.shape[0], 2, 1)
+        mps.center = n - 1
+        return mps
+
+    def record(self, discarded):
+        self.report['max bond'] = max(self.report['max bond'], *(A.shape[2] for A in self.tensors))
+        if discarded > 0:
+            self.report['truncations'] += 1
+            self.report['discarded'] += discarded
+            self.report['fidelity'] *= 1 - discarded
+
+    def bonds(self):
+        return [A.shape[2] for A in self.tensors[:-1]]
+
+    def move_center(self, p):
+        while self.center < p:
+            A = self.tensors[self.center]
+            q, r = np.linalg.qr(A.reshape(-1, A.shape[2]))
+            self.tensors[self.center] = q.reshape(A.shape[0], 2, -1)
+            self.tensors[self.center + 1] = np.tensordot(r, self.tensors[self.center + 1], axes=(1, 0))
+            self.center += 1
+        while self.center > p:
+            A = self.tensors[self.center]
+            q, r = np.linalg.qr(A.reshape(A.shape[0], -1).T)
+            self.tensors[self.center] = q.T.reshape(-1, 2, A.shape[2])
+            self.tensors[self.center - 1] = np.tensordot(self.tensors[self.center - 1], r.T, axes=(2, 0))
+            self.center -= 1
+
+    def apply_block(self, U, p, k):
+        # U on sites p..p+k-1, bit j of its index on site p+j
+        self.move_center(p)
+        theta = self.tensors[p]
+        for j in range(1, k):
+            theta = np.tensordot(theta, self.tensors[p + j], axes=(-1, 0))
+        left, right = theta.shape[0], theta.shape[-1]
+
+        # in the C order of the reversed site axes the matrix index is the plain binary number
+        axes = [0] + list(range(k, 0, -1)) + [k + 1]
+        theta = theta.transpose(axes).reshape(left, 2 ** k, right)
+        theta = np.einsum('ij,ajb->aib', U, theta).reshape((left,) + (2,) * k + (right,)).transpose(axes)
+
+        rest = theta.reshape(left, -1)
+        for j in range(k - 1):
+            u, rest, discarded = split(rest.reshape(rest.shape[0] * 2, -1), self.max_bond, self.cutoff)
+            self.tensors[p + j] = u.reshape(-1, 2, u.shape[1])
+            self.record(discarded)
+        self.tensors[p + k - 1] = rest.reshape(-1, 2, right)
+        self.center = p + k - 1
+
+    def swap_sites(self, i):
+        # exchange the qubits at sites i and i+1
+        self.apply_block(SWAP, i, 2)
+        a, b = self.qubits[i], self.qubits[i + 1]
+        self.qubits[i], self.qubits[i + 1] = b, a
+        self.sites[a], self.sites[b] = i + 1, i
+
+    def gather(self, qs):
+        # moves the qubits qs next to the leftmost of them, returns the first site
+        order = sorted(qs, key=lambda q: self.sites[q])
+        p = self.sites[order[0]]
+        for (j, q) in enumerate(order):
+            while self.sites[q] > p + j:
+                self.swap_sites(self.sites[q] - 1)
+        return p
+
+    def apply(self, tr):
+        if tr.name == 'swap':
+            i, j = self.sites[tr.i], self.sites[tr.j]
+            self.sites[tr.i], self.sites[tr.j] = j, i
+            self.qubits[i], self.qubits[j] = tr.j, tr.i
+            return
+
+        M, qs = transformation_matrix(tr)
+        p = self.gather(qs)
+        block = self.qubits[p:p + len(qs)]
+        self.apply_block(embed(M, qs, block), p, len(qs))
+
+    def amplitude(self, k):
+        # amplitude of the basis state k (a python int, bit q is qubit q)
+        v = np.ones((1, 1), dtype=self.tensors[0].dtype)
+        for (s, A) in enumerate(self.tensors):
+            v = v @ A[:, (k >> self.qubits[s]) & 1, :]
+        return complex(v[0, 0])
+
+    def samples(self, shots, qubits=None, seed=None):
+        # (shots, len(qubits)) array of outcome bits, every shot draws the sites left to right from the
+        # conditional probabilities (right canonical form makes them local)
+        self.move_center(0)
+        rng = np.random.default_rng(seed)
+        bits = np.zeros((shots, self.n), dtype=np.uint8)
+        v = np.ones((shots, 1), dtype=self.tensors[0].dtype)
+        for (s, A) in enumerate(self.tensors):
+            w = np.einsum('sl,lbr->sbr', v, A)
+            p = np.sum(np.abs(w) ** 2, axis=2)
+            b = (rng.random(shots) * p.sum(axis=1) < p[:, 1]).astype(np.uint8)
+            bits[:, self.qubits[s]] = b
+            v = w[np.arange(shots), b] / np.sqrt(p[np.arange(shots), b])[:, None]
+        qubits = list(range(self.n)) if qubits is None else list(qubits)
+        return bits[:, qubits]
+
+    def sample(self, shots, qubits=None, seed=None):
+        # histogram over the 2^len(qubits) outcomes like core.sample, bit i of an outcome is qubits[i]
+        return bits_histogram(self.samples(shots, qubits, seed))
+
+    def measure_counts(self, shots, qubits=None, seed=None):
+        # {outcome: count} for any number of qubits (outcomes are python ints)
+        return bits_counts(self.samples(shots, qubits, seed))
+
+    def to_state(self):
+        psi = self.tensors[0]
+        for A in self.tensors[1:]:
+            psi = np.tensordot(psi, A, axes=(-1, 0))
+        # axis 1 + s is site s, the C order wants qubit n-1 first
+        psi = psi.reshape((2,) * self.n).transpose([self.sites[q] for q in range(self.n)[::-1]])
+        return psi.reshape(-1)
+
+
+def simulate(transformations, n, max_bond=None, cutoff=1e-12, state=None):
+    # MPS after the transformations on |0...0> (or on a dense state), see QuantumCircuit.mps
+    mps = MPS(n, max_bond, cutoff) if state is None else MPS.from_state(state, max_bond, cutoff)
+    for tr in transformations:
+        mps.apply(tr)
+    return mps
@@ -0,0 +1,113 @@
+from math import sqrt
+from multiprocessing import Pool
+
+import numpy as np
+
+from hume.simulator.core import transform, swap_qubits, probabilities, marginal_probabilities
+from hume.simulator.fusion import Fused, support, targets
+from hume.simulator.plan import encode, apply_operation
+
+# Noise as Monte Carlo trajectories: every trajectory is a pure state that, after each noisy gate, goes on with one
+# Kraus operator K of the channel, drawn with probability ||K psi||^2 and renormalized. The average of the outcome
+# probabilities over the trajectories converges to the ones of the density matrix, without its 4^n memory. A batch
+# of trajectories is one (batch, 2^n) array, every Kraus step is one sweep with a stack of matrices.
+
+I = np.eye(2, dtype=complex)
+X = np.array([[0, 1], [1, 0]], dtype=complex)
+Y = np.array([[0, -1j], [1j, 0]], dtype=complex)
+Z = np.array([[1, 0], [0, -1]], dtype=complex)
+
+
+def depolarizing(p):
+    return [sqrt(1 - p) * I, sqrt(p / 3) * X, sqrt(p / 3) * Y, sqrt(p / 3) * Z]
+
+
+def amplitude_damping(gamma):
+    return [np.array([[1, 0], [0, sqrt(1 - gamma)]], dtype=complex),
+            np.array([[0, sqrt(gamma)], [0, 0]], dtype=complex)]
+
+
+def bit_flip(p):
+    return [sqrt(1 - p) * I, sqrt(p) * X]
+
+
+def phase_flip(p):
+    return [sqrt(1 - p) * I, sqrt(p) * Z]
+
+
+def gate_type(tr):
+    # 'h', 'x', 'cx', 'mcx', 'cp', 'swap', ... (the gate name with one 'c' for a control, 'mc' for more)
+    controls = getattr(tr, 'controls', [])
+    return ('c' if len(controls) == 1 else 'mc' if len(controls) > 1 else '') + tr.name
+
+
+class NoiseModel:
+    # single qubit channels (lists of Kraus operators) by gate type, applied to every qubit the gate touches
+    # right after it, e.g. NoiseModel().add(depolarizing(0.01), ['h', 'cx']).add(amplitude_damping(0.02), ['x'])
+    def __init__(self):
+        self.channels = {}
+
+    def add(self, kraus, gate_types):
+        for name in gate_types:
+            self.channels.setdefault(name, []).append(np.array(kraus, dtype=complex))
+        return self
+
+    def after(self, tr):
+        return self.channels.get(gate_type(tr), [])
+
+
+def apply_channel(states, q, kraus, rng):
+    # one Kraus operator per trajectory, with the probabilities from the reduced density matrix of q
+    v = states.reshape(len(states), -1, 2, 2 ** q)
+    rho = np.einsum('bhil,bhjl->bij', v, v.conj())
+    p = np.maximum(np.real(np.einsum('kji,kjl,bli->bk', kraus.conj(), kraus, rho)), 0)
+    u = rng.random(len(states)) * p.sum(axis=1)
+    choice = np.minimum(np.sum(np.cumsum(p, axis=1) < u[:, None], axis=1), len(kraus) - 1)
+    norm = np.sqrt(p[np.arange(len(states)), choice])
+    transform(states, q, kraus[choice] / norm[:, None, None].astype(states.dtype))
+
+
+def run_trajectories(transformations, model, states, rng):
+    # in place on a (batch, 2^n) array
+    for tr in transformations:
+        if tr.name == 'swap':
+            swap_qubits(states, tr.i, tr.j)
+        else:
+            op, U, ts, cs = encode(Fused(tr.gate, targets(tr), 1, tr.controls) if tr.name == 'unitary' else tr)
+            apply_operation(states, op, ts, cs, U)
+        for kraus in model.after(tr):
+            for q in sorted(support(tr)):
+                apply_channel(states, q, kraus, rng)
+    return states
+
+
+def accumulate(transformations, model, state, trajectories, qubits=None, seed=None, batch=64):
+    # sum and sum of squares over the trajectories of the outcome probabilities
+    rng = np.random.default_rng(seed)
+    total, squares = 0, 0
+    for start in range(0, trajectories, batch):
+        states = np.tile(state, (min(batch, trajectories - start), 1))
+        run_trajectories(transformations, model, states, rng)
+        p = probabilities(states) if qubits is None else marginal_probabilities(states, qubits)
+        total = total + p.sum(axis=0)
+        squares = squares + (p ** 2).sum(axis=0)
+    return total, squares
+
+
+def simulate(transformations, model, state, trajectories, qubits=None, seed=None, processes=1, batch=64):
+    # mean outcome probabilities over the trajectories and their standard error (the convergence estimate);
+    # with processes > 1 a worker pool splits the trajectories, each with its own random stream
+    seeds = np.random.SeedSequence(seed).spawn(processes)
+    counts = [len(c) for c in np.array_split(np.arange(trajectories), processes)]
+    jobs = [(transformations, model, state, c, qubits, s, batch) for (c, s) in zip(counts, seeds) if c > 0]
+    if processes == 1:
+        results = [accumulate(*jobs[0])]
+    else:
+        with Pool(len(jobs)) as pool:
+            results = pool.starmap(accumulate, jobs)
+
+    total = sum(r[0] for r in results)
+    squares = sum(r[1] for r in results)
+    mean = total / trajectories
+    variance = np.maximum(squares / trajectories - mean ** 2, 0)
+    return mean, np.sqrt(variance / trajectories)
@@ -0,0 +1,65 @@
+import numpy as np
+
+from hume.simulator.core import control_mask, as_gate
+
+
+def patterns(tr):
+    # (mask, value) pairs: the amplitudes k with k & mask == value are the ones the transformation can change
+    if tr.name == 'swap':
+        mask = (1 << tr.i) | (1 << tr.j)
+        return [(mask, 1 << tr.i), (mask, 1 << tr.j)]
+    mask = control_mask(tr.controls)
+    if tr.name != 'unitary':
+        # a 2x2 unitary with an entry 1 on the diagonal is diagonal and leaves that half of the target alone
+        gate = as_gate(tr.gate)
+        target = mask | (1 << tr.target)
+        if gate[0, 0] == 1:
+            return [(target, target)]
+        if gate[1, 1] == 1:
+            return [(target, mask)]
+    return [(mask, mask)]
+
+
+class Step:
+    # what changed since the previous step of an observer: the transformations applied and the (mask, value)
+    # patterns of the amplitudes they could change; values holds the new amplitudes at indices() if requested
+    def __init__(self, count, transformations, patterns, state, values=False):
+        self.count = count
+        self.transformations = transformations
+        self.patterns = patterns
+        self.size = state.shape[-1]
+        self.values = state[..., self.indices()].copy() if values else None
+
+    def changed(self):
+        # boolean mask over the amplitudes
+        k = np.arange(self.size)
+        changed = np.zeros(self.size, dtype=bool)
+        for (mask, value) in self.patterns:
+            changed |= (k & mask) == value
+        return changed
+
+    def indices(self):
+        if (0, 0) in self.patterns:
+            return slice(None)
+        return np.flatnonzero(self.changed())
+
+
+class Observer:
+    # called with a Step every stride transformations (and after the last one)
+    def __init__(self, callback, stride=1, values=False):
+        self.callback = callback
+        self.stride = stride
+        self.values = values
+        self.transformations = []
+        self.patterns = set()
+
+    def notify(self, count, tr, state, last=False, renormalized=False):
+        self.transformations.append(tr)
+        self.patterns.update(patterns(tr))
+        if renormalized:
+            self.patterns.add((0, 0))
+
+        if count % self.stride == 0 or last:
+            self.callback(Step(count, self.transformations, sorted(self.patterns), state, self.values))
+            self.transformations = []
+            self.patterns = set()
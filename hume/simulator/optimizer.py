@@ -0,0 +1,99 @@
+from copy import copy
+from math import pi
+
+from hume.simulator.fusion import support
+from hume.simulator.parameter import Parameter, rotation
+
+# Peephole pass over circuit transformations. Every transformation looks back through the ones already kept, past
+# the ones it commutes with, for a partner: the same self-inverse gate cancels, the same rotation merges (angles
+# add up). Cancelling a pair makes its neighbours adjacent, so x h h x goes away entirely.
+
+SELF_INVERSE = ['h', 'x', 'y', 'z']
+ROTATIONS = ['p', 'rx', 'ry', 'rz']
+# controlled z and p only put a phase on the all-ones value, the target is one more control
+SYMMETRIC = ['z', 'p']
+# angle after which a rotation is the identity (also with controls)
+PERIOD = {'p': 2 * pi, 'rx': 4 * pi, 'ry': 4 * pi, 'rz': 4 * pi}
+
+
+def key(tr):
+    # transformations with the same key are the same gate up to the angle, None for the ones never combined
+    if tr.name == 'swap':
+        return 'swap', frozenset([tr.i, tr.j])
+    if tr.name in SYMMETRIC:
+        return tr.name, frozenset(tr.controls + [tr.target])
+    if tr.name in SELF_INVERSE + ROTATIONS:
+        return tr.name, tr.target, frozenset(tr.controls)
+    return None
+
+
+def roles(tr):
+    # 'z' for the qubits a transformation is diagonal on (controls, targets of z, p and rz), 'x' for targets of
+    # x and rx, None otherwise
+    if key(tr) is None or tr.name == 'swap':
+        return {q: None for q in support(tr)}
+    qubit_roles = {c: 'z' for c in tr.controls}
+    qubit_roles[tr.target] = 'z' if tr.name in ['z', 'p', 'rz'] else 'x' if tr.name in ['x', 'rx'] else None
+    return qubit_roles
+
+
+def commute(a, b):
+    # on every shared qubit both are functions of the same Pauli operator
+    ra, rb = roles(a), roles(b)
+    return all(ra[q] is not None and ra[q] == rb[q] for q in ra.keys() & rb.keys())
+
+
+def is_identity(tr):
+    if tr.name not in ROTATIONS or isinstance(tr.arg, Parameter):
+        return False
+    r = tr.arg % PERIOD[tr.name]
+    return min(r, PERIOD[tr.name] - r) < 1e-12
+
+
+def merge_rotations(a, b):
+    # None when both angles are parameters (one parameter per angle)
+    if isinstance(a.arg, Parameter) and isinstance(b.arg, Parameter):
+        return None
+    arg = a.arg + b.arg
+    merged = copy(a)
+    merged.arg = arg
+    merged.gate = rotation(a.name, arg)
+    return merged
+
+
+def optimize(transformations, window=64):
+    # returns the new list and a report with the gate counts before and after; window bounds how far back a
+    # transformation looks for a partner
+    kept = []
+    report = {'before': len(transformations), 'cancelled': 0, 'merged': 0, 'dropped': 0}
+    for tr in transformations:
+        if is_identity(tr):
+            report['dropped'] += 1
+            continue
+
+        k = key(tr)
+        for j in range(len(kept) - 1, max(len(kept) - 1 - window, -1), -1):
+            other = kept[j]
+            if k is not None and key(other) == k:
+                if tr.name in ROTATIONS:
+                    merged = merge_rotations(other, tr)
+                    if merged is not None:
+                        report['merged'] += 1
+                        if is_identity(merged):
+                            report['dropped'] += 1
+                            del kept[j]
+                        else:
+                            kept[j] = merged
+                        break
+                else:
+                    report['cancelled'] += 1
+                    del kept[j]
+                    break
+            if not commute(other, tr):
+                kept.append(tr)
+                break
+        else:
+            kept.append(tr)
+
+    report['after'] = len(kept)
+    return kept, report
@@ -0,0 +1,56 @@
+from hume.simulator.gates import phase, rx, ry, rz
+
+rotations = {'p': phase, 'rx': rx, 'ry': ry, 'rz': rz}
+
+# unbound gates are built at this angle, so that fusion sees the generic structure (p and rz diagonal, rx and ry not)
+GENERIC = 0.6180339887
+
+
+class Parameter:
+    # named angle, scale * value + offset, bound later with QuantumCircuit.bind or Plan.bind
+    def __init__(self, name, scale=1.0, offset=0.0):
+        self.name = name
+        self.scale = scale
+        self.offset = offset
+
+    def value(self, values):
+        return self.scale * values[self.name] + self.offset
+
+    def __neg__(self):
+        return Parameter(self.name, -self.scale, -self.offset)
+
+    def __mul__(self, a):
+        return Parameter(self.name, self.scale * a, self.offset * a)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, a):
+        return self * (1 / a)
+
+    def __add__(self, a):
+        # one parameter per angle
+        assert (not isinstance(a, Parameter))
+        return Parameter(self.name, self.scale, self.offset + a)
+
+    __radd__ = __add__
+
+    def __sub__(self, a):
+        return self + (-a)
+
+    def __rsub__(self, a):
+        return -self + a
+
+    def __round__(self, digits=None):
+        return self
+
+    def __str__(self):
+        return f'{self.scale}*{self.name}+{self.offset}'
+
+
+def is_parametric(tr):
+    return isinstance(getattr(tr, 'arg', None), Parameter)
+
+
+def rotation(name, theta):
+    # gate of a rotation, at the generic angle while theta is unbound
+    return rotations[name](theta.value({theta.name: GENERIC}) if isinstance(theta, Parameter) else theta)
@@ -0,0 +1,239 @@
+from copy import copy
+from functools import lru_cache
+
+import numpy as np
+
+from hume.simulator.core import transform, c_transform, mc_transform, d_transform, transform_qubits, \
+    transform_phases, permute_qubits, normalize, init_state, num_qubits, as_gate, is_diagonal, \
+    probabilities as probabilities_of
+from hume.simulator.fusion import fuse, merge_diagonals, relabel, embed, merge, merge_phases
+from hume.simulator.parameter import is_parametric, rotations
+
+# opcodes of a plan
+GATE = 0
+DIAGONAL = 1
+QUBITS = 2
+PHASES = 3
+
+
+@lru_cache(maxsize=None)
+def mask_qubits(mask):
+    return [q for q in range(mask.bit_length()) if (mask >> q) & 1]
+
+
+def qubit_mask(qs):
+    return sum(1 << q for q in qs)
+
+
+def parameters(tr):
+    # names of the parameters a transformation (or the ones merged into it) depends on
+    if is_parametric(tr):
+        return {tr.arg.name}
+    return set().union(*[parameters(s) for s in getattr(tr, 'sources', [])])
+
+
+def bind_transformation(tr, values):
+    if is_parametric(tr):
+        tr = copy(tr)
+        tr.arg = tr.arg.value(values)
+        tr.gate = rotations[tr.name](tr.arg)
+    elif len(parameters(tr)) > 0:
+        sources = [bind_transformation(s, values) for s in tr.sources]
+        return merge_phases(sources) if tr.name == 'diagonal' else merge(sources)
+    return tr
+
+
+def encode(tr):
+    if tr.name == 'diagonal':
+        return PHASES, np.asarray(tr.phases, dtype=complex), tr.qubits, []
+
+    if tr.name == 'fused':
+        # the kernels take the target bits in increasing order
+        ts, cs = sorted(tr.qubits), tr.controls
+        U = as_gate(tr.gate) if ts == list(tr.qubits) else embed(as_gate(tr.gate), tr.qubits, ts)
+        return QUBITS if len(ts) > 1 else DIAGONAL if is_diagonal(U) else GATE, U, ts, cs
+
+    U = as_gate(tr.gate)
+    return DIAGONAL if is_diagonal(U) else GATE, U, [tr.target], tr.controls
+
+
+def deposit(values, qubits):
+    # bit i of every value goes to position qubits[i]
+    k = np.zeros_like(values)
+    for (i, q) in enumerate(qubits):
+        k |= ((values >> i) & 1) << q
+    return k
+
+
+def read_only(U):
+    U = U.copy()
+    U.setflags(write=False)
+    return U
+
+
+def apply_operation(state, op, ts, cs, U, threads=1):
+    if op == PHASES:
+        transform_phases(state, U, ts, threads)
+    elif op == QUBITS:
+        transform_qubits(state, U, ts, cs, threads)
+    elif op == DIAGONAL:
+        d_transform(state, cs, ts[0], U, threads)
+    elif len(cs) == 0:
+        transform(state, ts[0], U, threads)
+    elif len(cs) == 1:
+        c_transform(state, cs[0], ts[0], U, threads)
+    else:
+        mc_transform(state, cs, ts[0], U, threads)
+
+
+class Plan:
+    # a compiled circuit: one opcode, target mask, control mask and matrix index per sweep, the matrices are
+    # deduplicated and every array is read only, so a plan can be shared, cached and sent to other processes;
+    # matrices that depend on parameters have their own slot and get replaced by bind
+    def __init__(self, n, opcodes, targets, controls, gates, matrices, perm, report=None, dtype=complex,
+                 bindable=()):
+        self.n = n
+        self.opcodes = opcodes
+        self.targets = targets
+        self.controls = controls
+        self.gates = gates
+        self.matrices = matrices
+        self.perm = perm
+        self.report = report
+        self.dtype = dtype
+        self.bindable = bindable
+        self.parameters = sorted(set().union(*[parameters(tr) for (_, tr) in bindable]))
+
+    def bind(self, values):
+        if len(self.bindable) == 0:
+            return self
+        matrices = list(self.matrices)
+        for (g, tr) in self.bindable:
+            matrices[g] = read_only(encode(bind_transformation(tr, values))[1])
+        return Plan(self.n, self.opcodes, self.targets, self.controls, self.gates, tuple(matrices), self.perm,
+                    self.report, self.dtype)
+
+    def sweep(self, values, state=None, threads=1, renormalize=0, probabilities=False):
+        # values maps every parameter to an array of points, which become the batch axis: one sweep per gate
+        # for all points, with a stack of matrices (one per point) in the slots that depend on parameters
+        missing = [name for name in self.parameters if name not in values]
+        if missing:
+            raise ValueError(f'no values for the parameters {missing}')
+        lengths = {name: len(values[name]) for name in self.parameters}
+        if len(set(lengths.values())) > 1:
+            raise ValueError(f'every parameter needs the same number of points, got {lengths}')
+        points = len(values[self.parameters[0]]) if self.parameters else 1
+        matrices = list(self.matrices)
+        for (g, tr) in self.bindable:
+            point = lambda p: {name: values[name][p] for name in self.parameters}
+            matrices[g] = np.array([encode(bind_transformation(tr, point(p)))[1] for p in range(points)])
+
+        plan = Plan(self.n, self.opcodes, self.targets, self.controls, self.gates, tuple(matrices), self.perm,
+                    self.report, self.dtype)
+        start = init_state(self.n, self.dtype) if state is None else np.asarray(state, dtype=self.dtype)
+        states = plan.execute(np.tile(start, (points, 1)), threads, renormalize)
+        return probabilities_of(states) if probabilities else states
+
+    def block_qubits(self):
+        # qubits whose basis value no gate changes: only diagonal ops target them and they end where they started,
+        # so the unitary is block diagonal with one block per value of these qubits
+        changed = 0
+        for (op, ts) in zip(self.opcodes.tolist(), self.targets.tolist()):
+            if op in [GATE, QUBITS]:
+                changed |= ts
+        return [q for q in range(self.n) if not (changed >> q) & 1 and self.perm[q] == q]
+
+    def unitary_blocks(self, threads=1):
+        # blocks of the unitary on the free qubits, keyed by the value of the block qubits;
+        # each block evolves its basis columns as one batch
+        fixed = self.block_qubits()
+        free = [q for q in range(self.n) if q not in fixed]
+        columns = deposit(np.arange(2 ** len(free)), free)
+        blocks = {}
+        for c in range(2 ** len(fixed)):
+            ks = columns | deposit(np.array(c), fixed)
+            states = np.zeros((len(ks), 2 ** self.n), dtype=self.dtype)
+            states[np.arange(len(ks)), ks] = 1
+            blocks[c] = self.execute(states, threads)[:, ks].T
+        return fixed, free, blocks
+
+    def to_unitary(self, form='dense', threads=1):
+        # form: 'dense' (2^n x 2^n array), 'sparse' (scipy csr matrix) or 'blocks' (see unitary_blocks)
+        fixed, free, blocks = self.unitary_blocks(threads)
+        if form == 'blocks':
+            return fixed, free, blocks
+
+        columns = deposit(np.arange(2 ** len(free)), free)
+        indices = {c: columns | deposit(np.array(c), fixed) for c in blocks}
+        if form == 'dense':
+            U = np.zeros((2 ** self.n, 2 ** self.n), dtype=self.dtype)
+            for (c, block) in blocks.items():
+                U[np.ix_(indices[c], indices[c])] = block
+            return U
+
+        from scipy.sparse import coo_matrix
+        rows, cols, data = [], [], []
+        for (c, block) in blocks.items():
+            i, j = np.nonzero(block)
+            rows.append(indices[c][i])
+            cols.append(indices[c][j])
+            data.append(block[i, j])
+        shape = (2 ** self.n, 2 ** self.n)
+        return coo_matrix((np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))), shape).tocsr()
+
+    def __len__(self):
+        return len(self.opcodes)
+
+    def operations(self):
+        # (opcode, targets, controls, matrix) of every sweep
+        ops = zip(self.opcodes.tolist(), self.targets.tolist(), self.controls.tolist(), self.gates.tolist())
+        return [(op, mask_qubits(ts), mask_qubits(cs), self.matrices[g]) for (op, ts, cs, g) in ops]
+
+    def execute(self, state, threads=1, renormalize=0):
+        # in place on a state of n qubits (any leading batch axes)
+        assert (num_qubits(state) == self.n and len(self.parameters) == 0)
+        for (k, (op, ts, cs, U)) in enumerate(self.operations()):
+            apply_operation(state, op, ts, cs, U, threads)
+            if renormalize and (k + 1) % renormalize == 0:
+                normalize(state)
+
+        if self.perm != tuple(range(self.n)):
+            permute_qubits(state, list(self.perm))
+        return state
+
+    def run(self, state=None, threads=1, renormalize=0):
+        # the input is left alone, |0...0> when no state is given
+        state = init_state(self.n, self.dtype) if state is None else np.array(state, dtype=self.dtype)
+        return self.execute(state, threads, renormalize)
+
+
+def compile_plan(transformations, n, fusion=True, dtype=complex):
+    # swaps relabel qubits, then diagonal runs and small neighbourhoods are merged like in QuantumCircuit.run
+    relabeled, perm = relabel(transformations, n)
+    report = None
+    if fusion:
+        relabeled, report = fuse(merge_diagonals(relabeled))
+        report['gates'] = len(transformations)
+        report['fused'] = len(transformations) - len(relabeled)
+
+    ops = []
+    matrices = []
+    index = {}
+    bindable = []
+    for tr in relabeled:
+        op, U, ts, cs = encode(tr)
+        if len(parameters(tr)) > 0:
+            bindable.append((len(matrices), tr))
+            key = len(matrices)
+        else:
+            key = (U.shape, U.tobytes())
+
+        if key not in index:
+            index[key] = len(matrices)
+            matrices.append(read_only(U))
+        ops.append((op, qubit_mask(ts), qubit_mask(cs), index[key]))
+
+    columns = [np.array([o[j] for o in ops], dtype=np.int64) for j in range(4)]
+    for c in columns:
+        c.setflags(write=False)
+    return Plan(n, *columns, tuple(matrices), tuple(perm), report, dtype, tuple(bindable))
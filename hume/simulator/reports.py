@@ -0,0 +1,112 @@
+from collections import OrderedDict
+
+
+class Reports:
+    # Named reports of a circuit, in the order they were made. A report is (start state, transformations,
+    # end state, transformation count), where the start state is the end state of the previous report.
+    #
+    # Only the end states are stored: those of every k-th report are checkpoints, the others live in an LRU cache.
+    # Checkpoints and cache together stay within budget bytes (None = keep everything): cached states are evicted
+    # first, then every second checkpoint is dropped (k doubles), so memory stays bounded and the replay length
+    # grows instead. An evicted state is recomputed on demand from the nearest earlier stored state by running the
+    # transformations in between.
+    def __init__(self, initial, evolve, budget=None, every=16):
+        # initial() gives the state before the first report, evolve(state, transformations) the state after them
+        self.initial = initial
+        self.evolve = evolve
+        self.budget = budget
+        self.every = every
+        # name -> (previous report name or None, transformations, count)
+        self.entries = OrderedDict()
+        self.checkpoints = {}
+        self.cache = OrderedDict()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, name):
+        return name in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def keys(self):
+        return self.entries.keys()
+
+    def values(self):
+        return [self[name] for name in self.entries]
+
+    def items(self):
+        return [(name, self[name]) for name in self.entries]
+
+    def latest(self):
+        # report with the most transformations, the next report starts from its end state
+        return max(self.entries, key=lambda name: self.entries[name][2], default=None)
+
+    def add(self, name, previous, transformations, count, end):
+        if name in self.entries:
+            self.checkpoints.pop(name, None)
+            self.cache.pop(name, None)
+        self.entries[name] = (previous, transformations, count)
+        if len(self.entries) % self.every == 1 or self.every == 1:
+            self.checkpoints[name] = end
+            self.fit()
+        else:
+            self.store(name, end)
+
+    def pop(self, name):
+        self.checkpoints.pop(name, None)
+        self.cache.pop(name, None)
+        return self.entries.pop(name)
+
+    def store(self, name, state):
+        # also used to hand in a state computed elsewhere (e.g. by undoing later steps)
+        if name in self.checkpoints:
+            return
+        self.cache[name] = state
+        self.cache.move_to_end(name)
+        self.fit()
+
+    def size(self):
+        return sum(s.nbytes for s in self.checkpoints.values()) + sum(s.nbytes for s in self.cache.values())
+
+    def fit(self):
+        # down to the most recent cached state, then thinner checkpoints, then no cache; one state always stays
+        while self.budget is not None and self.size() > self.budget:
+            if len(self.cache) > 1 or (len(self.cache) == 1 and len(self.checkpoints) == 1):
+                self.cache.popitem(last=False)
+            elif len(self.checkpoints) > 1:
+                self.every *= 2
+                positions = {name: p + 1 for (p, name) in enumerate(self.entries)}
+                first = next(iter(self.checkpoints))
+                self.checkpoints = {name: state for (name, state) in self.checkpoints.items()
+                                    if positions[name] % self.every == 1 or name == first}
+            else:
+                break
+
+    def end_state(self, name):
+        if name is None:
+            return self.initial()
+
+        # walk back to a stored state, then replay forward
+        chain = []
+        while name is not None and name not in self.checkpoints and name not in self.cache:
+            chain.append(name)
+            name = self.entries[name][0]
+
+        if name is None:
+            state = self.initial()
+        elif name in self.checkpoints:
+            state = self.checkpoints[name]
+        else:
+            state = self.cache[name]
+            self.cache.move_to_end(name)
+
+        for name in chain[::-1]:
+            state = self.evolve(state, self.entries[name][1])
+            self.store(name, state)
+        return state
+
+    def __getitem__(self, name):
+        previous, transformations, count = self.entries[name]
+        return self.end_state(previous), transformations, self.end_state(name), count
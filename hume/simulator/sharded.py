@@ -0,0 +1,254 @@
+import weakref
+from abc import ABC, abstractmethod
+from math import ceil, log2
+from multiprocessing import Pipe, Process, shared_memory
+
+import numpy as np
+
+from hume.simulator.core import transform, mc_transform, d_transform, transform_qubits, is_diagonal, as_gate, \
+    transform_phases
+from hume.simulator.fusion import fuse, merge_diagonals
+
+SWAP = np.array([[1, 0, 0, 0], [0, 0, 1, 0], [0, 1, 0, 0], [0, 0, 0, 1]], dtype=complex)
+
+# The state lives in one shared memory block split into 2^k contiguous shards. The top k physical qubits select
+# the shard ("global" qubits), the others index amplitudes inside a shard ("local" qubits). Every worker owns a
+# fixed set of shards and applies runs of local gates to them without any communication. A gate on a global
+# qubit first exchanges that qubit with a local one: shards that differ in the global bit swap halves pairwise,
+# and the logical to physical qubit map records the new position.
+
+
+def apply_local(shard, s, op, local_n):
+    kind, gate, qs, cs = op
+    for c in cs:
+        if c >= local_n and not (s >> (c - local_n)) & 1:
+            return
+    cs = [c for c in cs if c < local_n]
+
+    if kind == 'phase':
+        # diagonal gate on a global qubit: the shard sits entirely in one half
+        factor = gate[(s >> (qs[0] - local_n)) & 1, (s >> (qs[0] - local_n)) & 1]
+        if len(cs) == 0:
+            shard *= factor
+        else:
+            d_transform(shard, cs[1:], cs[0], [[1, 0], [0, factor]])
+    elif kind == 'diagonal':
+        # fix the bits of the global qubits in the phase tensor, what is left is a diagonal on local qubits
+        index = tuple((s >> (q - local_n)) & 1 if q >= local_n else slice(None) for q in qs[::-1])
+        local = [q for q in qs[::-1] if q < local_n]
+        order = sorted(range(len(local)), key=lambda a: -local[a])
+        phases = gate.reshape((2,) * len(qs))[index].transpose(order).reshape(-1)
+        transform_phases(shard, phases, sorted(local))
+    elif kind == 'unitary':
+        transform_qubits(shard, gate, qs, cs)
+    elif is_diagonal(gate):
+        d_transform(shard, cs, qs[0], gate)
+    elif len(cs) == 0:
+        transform(shard, qs[0], gate)
+    else:
+        mc_transform(shard, cs, qs[0], gate)
+
+
+def exchange(shard_a, shard_b, l):
+    # physical swap of a global qubit and the local qubit l between shards a (global bit 0) and b (global bit 1)
+    A = shard_a.reshape(-1, 2, 2 ** l)[:, 1, :]
+    B = shard_b.reshape(-1, 2, 2 ** l)[:, 0, :]
+    tmp = A.copy()
+    A[...] = B
+    B[...] = tmp
+
+
+def worker(name, n, local_n, dtype, shards, conn):
+    shm = shared_memory.SharedMemory(name=name)
+    state = np.ndarray((2 ** n,), dtype=dtype, buffer=shm.buf)
+    size = 2 ** local_n
+
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+
+        kind, payload = task
+        if kind == 'ops':
+            for s in shards:
+                shard = state[s * size:(s + 1) * size]
+                for op in payload:
+                    apply_local(shard, s, op, local_n)
+        else:
+            for (a, b, l) in payload:
+                exchange(state[a * size:(a + 1) * size], state[b * size:(b + 1) * size], l)
+        conn.send(True)
+
+    del state
+    shm.close()
+
+
+class Shards(ABC):
+    # logical to physical qubit bookkeeping shared by the sharded and the memory mapped simulators;
+    # subclasses apply a batch of local ops to every shard and exchange a global qubit with a local one
+    def __init__(self, n, global_qubits):
+        assert (0 <= global_qubits < n)
+        self.n = n
+        self.global_qubits = global_qubits
+        self.local_n = n - global_qubits
+        # physical position of every logical qubit
+        self.perm = list(range(n))
+        self.pending = []
+
+    @abstractmethod
+    def apply_ops(self, ops):
+        pass
+
+    @abstractmethod
+    def exchange_qubit(self, g, l):
+        pass
+
+    def flush(self):
+        if self.pending:
+            self.apply_ops(self.pending)
+            self.pending = []
+
+    def exchange_pairs(self, g):
+        # shard pairs that differ in global qubit g, the first one with the bit clear
+        return [(a, a | (1 << g)) for a in range(2 ** self.global_qubits) if not (a >> g) & 1]
+
+    def swap_physical(self, p, l):
+        # physical swap of a global position p and a local position l
+        self.flush()
+        self.exchange_qubit(p - self.local_n, l)
+        q, other = self.perm.index(p), self.perm.index(l)
+        self.perm[q], self.perm[other] = l, p
+
+    def localize(self, q, busy):
+        # move logical qubit q to the highest local position that the current gate does not use
+        self.swap_physical(self.perm[q], max(k for k in range(self.local_n) if k not in busy))
+
+    def apply(self, tr):
+        if tr.name == 'swap':
+            self.perm[tr.i], self.perm[tr.j] = self.perm[tr.j], self.perm[tr.i]
+            return
+
+        if tr.name == 'diagonal':
+            self.pending.append(('diagonal', tr.phases, [self.perm[q] for q in tr.qubits], []))
+            return
+
+        if tr.name == 'fused':
+            kind, gate, qs, cs = 'unitary', tr.gate, tr.qubits, tr.controls
+        elif tr.name == 'unitary':
+            qs = [tr.target + j for j in range(int(log2(len(tr.gate))))]
+            kind, gate, cs = 'unitary', tr.gate, tr.controls
+        else:
+            kind, gate, qs, cs = 'gate', as_gate(tr.gate), [tr.target], tr.controls
+
+        if kind == 'gate' and is_diagonal(gate) and self.perm[qs[0]] >= self.local_n:
+            kind = 'phase'
+        else:
+            for q in qs:
+                if self.perm[q] >= self.local_n:
+                    self.localize(q, [self.perm[k] for k in qs + list(cs)])
+
+        self.pending.append((kind, gate, [self.perm[q] for q in qs], [self.perm[c] for c in cs]))
+
+    def run(self, transformations):
+        for tr in transformations:
+            self.apply(tr)
+        self.flush()
+
+    def restore(self):
+        # physical position p gets logical qubit p back
+        for p in range(self.n):
+            a, b = sorted([p, self.perm[p]])
+            if a == b:
+                continue
+
+            if b < self.local_n:
+                self.pending.append(('unitary', SWAP, [a, b], []))
+                qa, qb = self.perm.index(a), self.perm.index(b)
+                self.perm[qa], self.perm[qb] = b, a
+            elif a < self.local_n:
+                self.swap_physical(b, a)
+            else:
+                # two global positions are swapped through the local position 0
+                self.swap_physical(a, 0)
+                self.swap_physical(b, 0)
+                self.swap_physical(a, 0)
+        self.flush()
+
+
+class ShardedSimulator(Shards):
+    def __init__(self, n, global_qubits, processes, dtype=complex):
+        super().__init__(n, global_qubits)
+        self.processes = processes
+
+        self.shm = shared_memory.SharedMemory(create=True, size=2 ** n * np.dtype(dtype).itemsize)
+        self.state = np.ndarray((2 ** n,), dtype=dtype, buffer=self.shm.buf)
+
+        self.owners = [s % processes for s in range(2 ** global_qubits)]
+        self.workers = []
+        for w in range(processes):
+            conn, child = Pipe()
+            shards = [s for s in range(2 ** global_qubits) if self.owners[s] == w]
+            p = Process(target=worker, args=(self.shm.name, n, self.local_n, dtype, shards, child), daemon=True)
+            p.start()
+            self.workers.append((p, conn))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        for (p, conn) in self.workers:
+            conn.send(None)
+            p.join()
+        self.workers = []
+        # the block is handed over with self.state (see read): unlink only drops its name, the parent's mapping is
+        # closed once that array and every view of it are gone
+        self.shm.unlink()
+        weakref.finalize(self.state, self.shm.close)
+        self.state = None
+
+    def initialize(self, state=None):
+        # |0...0> when state is None
+        if state is None:
+            self.state[:] = 0
+            self.state[0] = 1
+        else:
+            self.state[:] = state
+        self.perm = list(range(self.n))
+
+    def broadcast(self, tasks):
+        for (w, (_, conn)) in enumerate(self.workers):
+            conn.send(tasks[w])
+        for (_, conn) in self.workers:
+            conn.recv()
+
+    def apply_ops(self, ops):
+        self.broadcast([('ops', ops)] * self.processes)
+
+    def exchange_qubit(self, g, l):
+        tasks = [('exchange', []) for _ in range(self.processes)]
+        for (a, b) in self.exchange_pairs(g):
+            tasks[self.owners[a]][1].append((a, b, l))
+        self.broadcast(tasks)
+
+    def read(self):
+        # in place, the returned array is the shared block itself
+        self.restore()
+        return self.state
+
+
+def run_sharded(qc, processes, global_qubits=None):
+    if global_qubits is None:
+        global_qubits = min(ceil(log2(processes)), qc.num_qubits - 1)
+
+    transformations = qc.bound_transformations()
+    if qc.fuses(qc.num_qubits):
+        transformations = fuse(merge_diagonals(transformations))[0]
+    with ShardedSimulator(qc.num_qubits, global_qubits, processes, qc.dtype) as sim:
+        # the parent never allocates a dense state of its own
+        sim.initialize(qc.dense_state)
+        sim.run(transformations)
+        state = sim.read()
+    return state
@@ -0,0 +1,115 @@
+import numpy as np
+
+from hume.simulator.core import normalize, permute_qubits
+from hume.simulator.plan import PHASES, DIAGONAL, apply_operation, deposit, qubit_mask
+
+# the state is kept sparse while at most this fraction of the amplitudes is nonzero, and goes back to sparse
+# from dense when the fraction falls under half of it (checked every CHECK_EVERY sweeps)
+SPARSE_DENSITY = 2 ** -6
+CHECK_EVERY = 16
+
+
+def extract(indices, qubits):
+    # bit qubits[i] of every index goes to bit i
+    k = np.zeros_like(indices)
+    for (i, q) in enumerate(qubits):
+        k |= ((indices >> q) & 1) << i
+    return k
+
+
+def tolerance(dtype):
+    # amplitudes that cancel leave residues of a few ulps of the amplitudes they came from, those are dropped;
+    # relative, an absolute cutoff would drop real amplitudes of single precision states
+    return 16 * np.finfo(dtype).eps
+
+
+def significant(values, scale):
+    # values that are more than rounding residues of amplitudes of size scale
+    return np.abs(values) > tolerance(values.dtype) * scale
+
+
+class SparseState:
+    # nonzero amplitudes as an index array and a value array (no particular order, no duplicates)
+    def __init__(self, n, indices, values):
+        self.n = n
+        self.indices = indices
+        self.values = values
+
+    @staticmethod
+    def from_dense(state):
+        indices = np.flatnonzero(significant(state, np.max(np.abs(state))))
+        return SparseState(int(np.log2(state.size)), indices, state[indices])
+
+    @staticmethod
+    def count(state):
+        return np.count_nonzero(significant(state, np.max(np.abs(state))))
+
+    def write(self, state):
+        state[...] = 0
+        state[self.indices] = self.values
+
+    def apply(self, op, ts, cs, U):
+        if op == PHASES:
+            self.values *= U[extract(self.indices, ts)]
+            return
+
+        cmask = qubit_mask(cs)
+        selected = (self.indices & cmask) == cmask
+        if op == DIAGONAL:
+            bit = (self.indices[selected] >> ts[0]) & 1
+            self.values[selected] *= np.where(bit, U[1, 1], U[0, 0])
+            return
+
+        # every amplitude with the target bits cleared is the base of a 2^m block; only bases with a nonzero
+        # amplitude in their block can get nonzero amplitudes
+        indices, values = self.indices[selected], self.values[selected]
+        bases, block_of = np.unique(indices & ~qubit_mask(ts), return_inverse=True)
+        blocks = np.zeros((len(bases), len(U)), dtype=self.values.dtype)
+        blocks[block_of, extract(indices, ts)] = values
+        out = (blocks @ U.T.astype(self.values.dtype)).reshape(-1)
+        new = (bases[:, None] | deposit(np.arange(len(U)), ts)[None, :]).reshape(-1)
+
+        # relative to the largest input amplitude of each block
+        scale = np.repeat(np.max(np.abs(blocks), axis=1), len(U))
+        keep = significant(out, scale)
+        self.indices = np.concatenate([self.indices[~selected], new[keep]])
+        self.values = np.concatenate([self.values[~selected], out[keep]])
+
+    def normalize(self):
+        self.values /= np.sqrt(np.sum(np.abs(self.values) ** 2))
+
+    def permute(self, perm):
+        # logical qubit q is at physical position perm[q]
+        self.indices = extract(self.indices, perm)
+
+
+def execute(plan, state, threads=1, renormalize=0, density=SPARSE_DENSITY):
+    # Plan.execute, switching between a sparse and the dense representation as the number of nonzero
+    # amplitudes crosses the density threshold; the result is written to state in place
+    assert (state.ndim == 1 and len(plan.parameters) == 0)
+    sparse = SparseState.from_dense(state) if SparseState.count(state) <= density * state.size else None
+
+    for (k, (op, ts, cs, U)) in enumerate(plan.operations()):
+        renormalized = renormalize and (k + 1) % renormalize == 0
+        if sparse is not None:
+            sparse.apply(op, ts, cs, U)
+            if renormalized:
+                sparse.normalize()
+            if len(sparse.indices) > density * state.size:
+                sparse.write(state)
+                sparse = None
+        else:
+            apply_operation(state, op, ts, cs, U, threads)
+            if renormalized:
+                normalize(state)
+            if (k + 1) % CHECK_EVERY == 0 and SparseState.count(state) <= density / 2 * state.size:
+                sparse = SparseState.from_dense(state)
+
+    identity = plan.perm == tuple(range(plan.n))
+    if sparse is not None:
+        if not identity:
+            sparse.permute(plan.perm)
+        sparse.write(state)
+    elif not identity:
+        permute_qubits(state, list(plan.perm))
+    return state
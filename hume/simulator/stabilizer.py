@@ -0,0 +1,340 @@
+from math import pi
+
+import numpy as np
+
+from hume.simulator.core import bits_histogram, bits_counts
+
+# Clifford circuits as a stabilizer tableau (Aaronson, Gottesman: "Improved simulation of stabilizer circuits"):
+# rows 0..n-1 are the destabilizers, rows n..2n-1 the stabilizers, row k is (-1)^r[k] times the Pauli string
+# with X^x[k, q] Z^z[k, q] on qubit q (both bits set is Y); gates cost O(n) and measurements O(n^2)
+# instead of O(2^n)
+
+# on smaller states running the Clifford prefix dense is as fast as the tableau and its handoff
+STABILIZER_QUBITS = 20
+
+
+def quarter_turns(arg):
+    # arg as a multiple of pi/2, None when it is not one (or still a parameter)
+    if not isinstance(arg, (int, float)):
+        return None
+    k = arg / (pi / 2)
+    return round(k) if abs(k - round(k)) < 1e-9 else None
+
+
+def is_clifford(tr):
+    # gates the tableau runs: h, x, y, z, cx, cz, swap and phase gates (p, rz, cp) at multiples of pi/2
+    if tr.name == 'swap':
+        return True
+    if tr.name in ['x', 'z']:
+        return len(tr.controls) <= 1
+    if tr.name in ['h', 'y']:
+        return len(tr.controls) == 0
+    if tr.name in ['p', 'rz'] and len(tr.controls) == 0:
+        return quarter_turns(tr.arg) is not None
+    if tr.name == 'p' and len(tr.controls) == 1:
+        k = quarter_turns(tr.arg)
+        return k is not None and k % 2 == 0
+    return False
+
+
+def clifford_prefix(transformations):
+    # number of transformations before the first non-Clifford one
+    for (k, tr) in enumerate(transformations):
+        if not is_clifford(tr):
+            return k
+    return len(transformations)
+
+
+def g(x1, z1, x2, z2):
+    # exponent of i picked up by the Pauli (x1, z1) times (x2, z2), per qubit
+    x1, z1, x2, z2 = (a.astype(np.int8) for a in (x1, z1, x2, z2))
+    return np.where(x1 & z1, z2 - x2, np.where(x1, z2 * (2 * x2 - 1), np.where(z1, x2 * (1 - 2 * z2), 0)))
+
+
+def product(p, q):
+    # (x, z, r) of p times q, both with real signs and commuting
+    e = (2 * int(p[2]) + 2 * int(q[2]) + int(g(p[0], p[1], q[0], q[1]).sum())) % 4
+    assert (e in [0, 2])
+    return p[0] ^ q[0], p[1] ^ q[1], e // 2
+
+
+def reduce(rows):
+    # Gaussian elimination over GF(2): rows in reduced echelon form, the combinations of the input rows that
+    # give them, and the pivot column of every nonzero row
+    rows = rows.copy()
+    combos = np.eye(len(rows), dtype=np.uint8)
+    pivots = []
+    for col in range(rows.shape[1]):
+        candidates = np.flatnonzero(rows[len(pivots):, col])
+        if len(candidates) == 0:
+            continue
+        p = len(pivots) + candidates[0]
+        k = len(pivots)
+        rows[[k, p]] = rows[[p, k]]
+        combos[[k, p]] = combos[[p, k]]
+        others = np.flatnonzero(rows[:, col])
+        others = others[others != k]
+        rows[others] ^= rows[k]
+        combos[others] ^= combos[k]
+        pivots.append(col)
+    return rows, combos, pivots
+
+
+def index(bits):
+    return sum(1 << int(q) for q in np.flatnonzero(bits))
+
+
+class Tableau:
+    # track=True also follows one basis state b with a nonzero amplitude and its exact amplitude, which fixes the
+    # global phase of to_state (only h needs more than O(1) for that, an O(n^3) elimination)
+    def __init__(self, n, track=False):
+        self.n = n
+        self.xs = np.zeros((2 * n, n), dtype=np.uint8)
+        self.zs = np.zeros((2 * n, n), dtype=np.uint8)
+        self.rs = np.zeros(2 * n, dtype=np.uint8)
+        self.xs[np.arange(n), np.arange(n)] = 1
+        self.zs[n + np.arange(n), np.arange(n)] = 1
+        self.basis = np.zeros(n, dtype=np.uint8) if track else None
+        self.amplitude = 1
+
+    @staticmethod
+    def from_basis_state(n, k, amplitude=1, track=False):
+        # |k> times amplitude
+        t = Tableau(n, track)
+        for q in range(n):
+            if (k >> q) & 1:
+                t.x(q)
+        t.amplitude = amplitude
+        return t
+
+    def copy(self):
+        t = Tableau(0)
+        t.n = self.n
+        t.xs, t.zs, t.rs = self.xs.copy(), self.zs.copy(), self.rs.copy()
+        t.basis = None if self.basis is None else self.basis.copy()
+        t.amplitude = self.amplitude
+        return t
+
+    def row(self, k):
+        return self.xs[k], self.zs[k], self.rs[k]
+
+    def h(self, q):
+        if self.basis is not None:
+            # amplitudes of b and of b with bit q flipped, mixed by h; b moves to the larger output
+            b = self.basis
+            a = self.amplitude
+            other = self.amplitude_of(q)
+            a0, a1 = (a, other) if b[q] == 0 else (other, a)
+            out = [(a0 + a1) / np.sqrt(2), (a0 - a1) / np.sqrt(2)]
+            b[q] = 0 if abs(out[0]) >= abs(out[1]) else 1
+            self.amplitude = out[b[q]]
+
+        self.rs ^= self.xs[:, q] & self.zs[:, q]
+        self.xs[:, q], self.zs[:, q] = self.zs[:, q].copy(), self.xs[:, q].copy()
+
+    def s(self, q):
+        if self.basis is not None and self.basis[q]:
+            self.amplitude *= 1j
+        self.rs ^= self.xs[:, q] & self.zs[:, q]
+        self.zs[:, q] ^= self.xs[:, q]
+
+    def sdg(self, q):
+        for _ in range(3):
+            self.s(q)
+
+    def x(self, q):
+        if self.basis is not None:
+            self.basis[q] ^= 1
+        self.rs ^= self.zs[:, q]
+
+    def y(self, q):
+        if self.basis is not None:
+            self.amplitude *= 1j * (-1) ** int(self.basis[q])
+            self.basis[q] ^= 1
+        self.rs ^= self.xs[:, q] ^ self.zs[:, q]
+
+    def z(self, q):
+        if self.basis is not None and self.basis[q]:
+            self.amplitude *= -1
+        self.rs ^= self.xs[:, q]
+
+    def cx(self, c, t):
+        if self.basis is not None:
+            self.basis[t] ^= self.basis[c]
+        x, z = self.xs, self.zs
+        self.rs ^= x[:, c] & z[:, t] & (x[:, t] ^ z[:, c] ^ 1)
+        x[:, t] ^= x[:, c]
+        z[:, c] ^= z[:, t]
+
+    def cz(self, c, t):
+        if self.basis is not None and self.basis[c] and self.basis[t]:
+            self.amplitude *= -1
+        # h cx h on t, written out so that the tracking above is the only one
+        x, z = self.xs, self.zs
+        self.rs ^= x[:, c] & x[:, t] & (z[:, t] ^ z[:, c])
+        z[:, t] ^= x[:, c]
+        z[:, c] ^= x[:, t]
+
+    def swap(self, i, j):
+        if self.basis is not None:
+            self.basis[[i, j]] = self.basis[[j, i]]
+        self.xs[:, [i, j]] = self.xs[:, [j, i]]
+        self.zs[:, [i, j]] = self.zs[:, [j, i]]
+
+    def apply(self, tr):
+        assert (is_clifford(tr))
+        if tr.name == 'swap':
+            self.swap(tr.i, tr.j)
+        elif tr.name in ['p', 'rz'] and len(tr.controls) == 1:
+            for _ in range(quarter_turns(tr.arg) // 2 % 2):
+                self.cz(tr.controls[0], tr.target)
+        elif tr.name in ['p', 'rz']:
+            if tr.name == 'rz':
+                # rz(theta) = e^(-i theta / 2) p(theta)
+                self.amplitude *= np.exp(-0.5j * tr.arg)
+            for _ in range(quarter_turns(tr.arg) % 4):
+                self.s(tr.target)
+        elif len(tr.controls) == 1:
+            getattr(self, 'c' + tr.name)(tr.controls[0], tr.target)
+        else:
+            getattr(self, tr.name)(tr.target)
+
+    def stabilizer_with_x(self, bits):
+        # (x, z, r) of a stabilizer whose X part is bits, None when there is none
+        rows, combos, pivots = reduce(self.xs[self.n:])
+        target = bits.copy()
+        combo = np.zeros(self.n, dtype=np.uint8)
+        for (k, col) in enumerate(pivots):
+            if target[col]:
+                target ^= rows[k]
+                combo ^= combos[k]
+        if target.any():
+            return None
+        p = (np.zeros(self.n, dtype=np.uint8), np.zeros(self.n, dtype=np.uint8), 0)
+        for k in np.flatnonzero(combo):
+            p = product(p, self.row(self.n + k))
+        return p
+
+    def amplitude_of(self, q):
+        # amplitude of the tracked basis state with bit q flipped: a stabilizer P maps it to +-1, +-i times b,
+        # and P psi = psi
+        e = np.zeros(self.n, dtype=np.uint8)
+        e[q] = 1
+        p = self.stabilizer_with_x(e)
+        if p is None:
+            return 0
+        c = self.basis ^ e
+        return np.conj(pauli_phase(p, c)) * self.amplitude
+
+    def rowsum(self, hs, i):
+        # rows hs times row i
+        e = 2 * self.rs[hs].astype(np.int64) + 2 * int(self.rs[i]) + \
+            g(self.xs[i], self.zs[i], self.xs[hs], self.zs[hs]).sum(axis=-1)
+        self.rs[hs] = (e % 4) // 2
+        self.xs[hs] ^= self.xs[i]
+        self.zs[hs] ^= self.zs[i]
+
+    def measure(self, q, outcome=None, seed=None):
+        # measures qubit q in the Z basis and collapses; outcome forces a random result (seed may be a
+        # np.random.Generator); the tracked amplitude is dropped
+        self.basis = None
+        n = self.n
+        candidates = np.flatnonzero(self.xs[n:, q])
+        if len(candidates) == 0:
+            # deterministic, the product of the stabilizers that the destabilizers with an X on q pick
+            p = (np.zeros(n, dtype=np.uint8), np.zeros(n, dtype=np.uint8), 0)
+            for k in np.flatnonzero(self.xs[:n, q]):
+                p = product(p, self.row(n + k))
+            return int(p[2])
+
+        p = n + candidates[0]
+        rows = np.flatnonzero(self.xs[:, q])
+        self.rowsum(rows[rows != p], p)
+        self.xs[p - n], self.zs[p - n], self.rs[p - n] = self.xs[p], self.zs[p], self.rs[p]
+        self.xs[p] = 0
+        self.zs[p] = 0
+        self.zs[p, q] = 1
+        self.rs[p] = np.random.default_rng(seed).integers(2) if outcome is None else outcome
+        return int(self.rs[p])
+
+    def support(self):
+        # the basis states with a nonzero amplitude are b + span(rows), all with the same probability
+        if self.basis is not None:
+            b = self.basis.copy()
+        else:
+            t = self.copy()
+            b = np.array([t.measure(q, 0) for q in range(self.n)], dtype=np.uint8)
+        rows, _, pivots = reduce(self.xs[self.n:])
+        return b, rows[:len(pivots)]
+
+    def samples(self, shots, qubits=None, seed=None):
+        # (shots, len(qubits)) array of outcome bits, the state is left alone
+        b, rows = self.support()
+        qubits = list(range(self.n)) if qubits is None else list(qubits)
+        bits = np.random.default_rng(seed).integers(0, 2, (shots, len(rows)), dtype=np.int64)
+        return ((bits @ rows.astype(np.int64)) & 1 ^ b)[:, qubits].astype(np.uint8)
+
+    def sample(self, shots, qubits=None, seed=None):
+        # histogram over the 2^len(qubits) outcomes like core.sample, bit i of an outcome is qubits[i]
+        return bits_histogram(self.samples(shots, qubits, seed))
+
+    def measure_counts(self, shots, qubits=None, seed=None):
+        # {outcome: count} for any number of qubits (outcomes are python ints)
+        return bits_counts(self.samples(shots, qubits, seed))
+
+    def to_state(self, dtype=complex):
+        # dense state vector from the support b + span(rows): a stabilizer P with X part r maps the amplitude of c
+        # to the one of c ^ r (P|c> = phase |c ^ r> and P psi = psi), so every row doubles the known amplitudes;
+        # 2^rank work and one scatter into the zero state
+        assert (self.basis is not None)
+        rows, combos, pivots = reduce(self.xs[self.n:])
+        indices = np.array([index(self.basis)], dtype=np.int64)
+        values = np.array([self.amplitude], dtype=dtype)
+        for k in range(len(pivots)):
+            p = (np.zeros(self.n, dtype=np.uint8), np.zeros(self.n, dtype=np.uint8), 0)
+            for i in np.flatnonzero(combos[k]):
+                p = product(p, self.row(self.n + i))
+            phases = pauli_phase(p, indices, index(p[1]))
+            indices = np.concatenate([indices, indices ^ index(p[0])])
+            values = np.concatenate([values, (phases * values).astype(dtype)])
+
+        state = np.zeros(2 ** self.n, dtype=dtype)
+        state[indices] = values
+        return state
+
+
+def pauli_phase(p, c, zmask=None):
+    # P|c> = phase |c ^ x> for P = (-1)^r i^(number of Y) X^x Z^z; c is a bit array or an array of indices
+    x, z, r = p
+    phase = (-1) ** int(r) * 1j ** int(np.sum(x & z))
+    if zmask is None:
+        return phase * (-1) ** int(np.sum(z & c))
+    return phase * (1 - 2 * parity(c & zmask))
+
+
+def parity(v):
+    # parity of the bits of nonnegative int64 values, by xor folding the halves
+    v = v.copy()
+    for shift in [32, 16, 8, 4, 2, 1]:
+        v ^= v >> shift
+    return (v & 1).astype(np.int8)
+
+
+def simulate(transformations, n, state=None):
+    # tableau after Clifford transformations on |0...0> (or on a basis state given as a dense vector), tracking
+    # the amplitude only when the result has to become a dense state again
+    t = Tableau(n) if state is None else from_state(state)
+    if t is None:
+        raise ValueError('a tableau starts from a basis state, the state has more than one nonzero amplitude')
+    for tr in transformations:
+        t.apply(tr)
+    return t
+
+
+def from_state(state):
+    # tableau of a basis state (with its amplitude) that tracks it, None for any other state
+    nonzero = np.flatnonzero(state)
+    if len(nonzero) != 1:
+        return None
+    n = int(np.log2(state.size))
+    return Tableau.from_basis_state(n, int(nonzero[0]), complex(state[nonzero[0]]), True)
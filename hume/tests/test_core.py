@@ -0,0 +1,154 @@
+from math import pi
+
+import numpy as np
+
+from hume.simulator.core import transform, c_transform, mc_transform, pair_generator, process_pair, is_bit_set, \
+    init_state, d_transform, is_diagonal, measure, swap_qubits, permute_qubits, \
+    marginal_probabilities, sample, probabilities
+from hume.simulator.gates import h, x, y, z, ry, rz, phase, rx
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.utils.matrix import rvs
+from hume.utils.common import all_close, generate_state
+from hume.tests.test_fusion import random_circuit
+
+
+def reference_transform(state, cs, t, gate):
+    n = len(state).bit_length() - 1
+    for (k0, k1) in filter(lambda p: all([is_bit_set(p[0], c) for c in cs]), pair_generator(n, t)):
+        process_pair(state, gate, k0, k1)
+
+
+def test_kernels_same_as_reference():
+    n = 5
+    for gate in [h, x, y, ry(0.3), rx(-1.2), phase(pi / 3)]:
+        for t in range(n):
+            for cs in [[], [(t + 1) % n], [(t + 1) % n, (t + 3) % n]]:
+                expected = generate_state(n)
+                reference_transform(expected, cs, t, gate)
+
+                state = init_state(n)
+                state[:] = generate_state(n)
+                if len(cs) == 0:
+                    transform(state, t, gate)
+                elif len(cs) == 1:
+                    c_transform(state, cs[0], t, gate)
+                else:
+                    mc_transform(state, cs, t, gate)
+
+                assert all_close(state, expected)
+
+
+def test_diagonal_kernel():
+    n = 5
+    for gate in [z, rz(0.9), phase(-pi / 5)]:
+        assert is_diagonal(gate)
+        for t in range(n):
+            for cs in [[], [(t + 2) % n], [(t + 1) % n, (t + 2) % n]]:
+                expected = generate_state(n)
+                reference_transform(expected, cs, t, gate)
+
+                state = init_state(n)
+                state[:] = generate_state(n)
+                d_transform(state, cs, t, gate)
+
+                assert all_close(state, expected)
+
+    assert not is_diagonal(h)
+
+
+def test_swap_and_permute_qubits():
+    n = 5
+    for (i, j) in [(0, 1), (4, 1), (2, 3)]:
+        expected = generate_state(n)
+        for (a, b) in [(i, j), (j, i), (i, j)]:
+            reference_transform(expected, [a], b, x)
+
+        state = init_state(n)
+        state[:] = generate_state(n)
+        swap_qubits(state, i, j)
+        assert all_close(state, expected)
+
+    # logical qubit q stored at position perm[q]
+    perm = [2, 0, 4, 1, 3]
+    state = init_state(n)
+    state[:] = generate_state(n)
+    physical = np.zeros_like(state)
+    for k in range(2 ** n):
+        physical[sum(((k >> q) & 1) << perm[q] for q in range(n))] = state[k]
+    permute_qubits(physical, perm)
+    assert all_close(physical, state)
+
+
+def test_kernels_on_lists():
+    state = generate_state(3)
+    expected = state.copy()
+    reference_transform(expected, [0], 2, ry(0.7))
+
+    c_transform(state, 0, 2, ry(0.7))
+    assert isinstance(state, list)
+    assert all_close(state, expected)
+
+
+def test_hadamard_layer():
+    n = 12
+    qc = QuantumCircuit(QuantumRegister(n))
+    for i in range(n):
+        qc.h(i)
+
+    assert all_close(qc.run(), [2 ** (-n / 2)] * 2 ** n)
+
+
+def test_threads_same_state():
+    n = 17
+    state = init_state(n)
+    state[:] = generate_state(n)
+    U2 = rvs(4)
+    U1 = rvs(2)
+
+    states = []
+    for threads in [1, 4]:
+        qc = random_circuit(n, 40, 7)
+        qc.threads = threads
+        qc.fusion = threads == 1
+        qc.initialize(state.copy())
+        qc.append_u(U2, QuantumRegister(2, 3))
+        qc.mc_unitary(U1, [0, 16], 9)
+        states.append(qc.run())
+
+    assert all_close(states[0], states[1])
+
+
+def test_single_precision():
+    n = 8
+    states = {}
+    for dtype in [np.complex128, np.complex64]:
+        qc = random_circuit(n, 100, 3)
+        qc.dtype = dtype
+        qc.renormalize = 10
+        qc.initialize(generate_state(n))
+        qc.append_qft(QuantumRegister(n))
+        states[dtype] = qc.run()
+        samples = measure(states[dtype], 100)
+        assert sum(samples.values()) == 100
+
+    assert states[np.complex64].dtype == np.complex64
+    assert np.allclose(states[np.complex64], states[np.complex128], atol=1e-5)
+    assert abs(np.linalg.norm(states[np.complex64]) - 1) < 1e-6
+
+
+def test_marginals_and_sampling():
+    n = 5
+    state = generate_state(n, 9)
+    p = probabilities(state)
+    qubits = [3, 0]
+    expected = np.zeros(4)
+    for k in range(2 ** n):
+        expected[((k >> 3) & 1) | (((k >> 0) & 1) << 1)] += p[k]
+    assert np.allclose(marginal_probabilities(state, qubits), expected)
+    assert np.allclose(marginal_probabilities(state, list(range(n))), p)
+
+    histogram = sample(state, 100000, qubits, seed=1)
+    assert histogram.sum() == 100000
+    assert np.all(histogram == sample(state, 100000, qubits, seed=1))
+    assert np.allclose(histogram / 100000, expected, atol=0.01)
+    assert sum(measure(state, 10, seed=2).values()) == 10
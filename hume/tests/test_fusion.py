@@ -0,0 +1,95 @@
+import random
+from math import pi
+
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.algos.grover import grover_circuit, prepare_uniform, phase_oracle_match
+from hume.algos.function_encoding import build_polynomial_circuit
+from hume.simulator.fusion import merge_diagonals, Diagonal, relabel
+from hume.utils.common import all_close, generate_state
+
+
+def random_circuit(n, gates, seed):
+    random.seed(seed)
+    qc = QuantumCircuit(QuantumRegister(n))
+    for _ in range(gates):
+        t = random.randrange(n)
+        others = [q for q in range(n) if q != t]
+        kind = random.choice(['h', 'x', 'ry', 'p', 'cx', 'cp', 'mcp', 'swap'])
+        if kind in ['h', 'x']:
+            getattr(qc, kind)(t)
+        elif kind in ['ry', 'p']:
+            getattr(qc, kind)(random.uniform(-pi, pi), t)
+        elif kind == 'cx':
+            qc.cx(random.choice(others), t)
+        elif kind == 'cp':
+            qc.cp(random.uniform(-pi, pi), random.choice(others), t)
+        elif kind == 'mcp':
+            qc.mcp(random.uniform(-pi, pi), random.sample(others, 3), t)
+        else:
+            qc.swap(t, random.choice(others))
+    return qc
+
+
+def run(qc, state, fusion):
+    qc.initialize(state.copy())
+    qc.fusion = fusion
+    transformations = qc.transformations.copy()
+    result = qc.run()
+    qc.transformations = transformations
+    return result
+
+
+def test_fusion_same_state():
+    n = 6
+    for seed in range(5):
+        qc = random_circuit(n, 60, seed)
+        state = generate_state(n, seed)
+
+        assert all_close(run(qc, state, True), run(qc, state, False))
+        assert qc.fusion_report['gates'] == 60
+        assert qc.fusion_report['sweeps'] + qc.fusion_report['fused'] == 60
+
+
+def test_fusion_single_qubit_runs():
+    n = 4
+    qc = grover_circuit(prepare_uniform(n), phase_oracle_match(n, [3]), 1)
+    qc.fusion = False
+    expected = qc.run()
+
+    qc = grover_circuit(prepare_uniform(n), phase_oracle_match(n, [3]), 1)
+    # small states run gate by gate unless fusion is asked for
+    qc.run()
+    assert qc.fusion_report is None
+
+    qc = grover_circuit(prepare_uniform(n), phase_oracle_match(n, [3]), 1)
+    qc.fusion = True
+    assert all_close(qc.run(), expected)
+    assert qc.fusion_report['fused'] > 0
+    assert qc.fusion_report['sweeps'] < qc.fusion_report['gates']
+
+
+def test_merge_diagonals():
+    terms = [(3, []), (-2, [0]), (1, [1]), (5, [0, 1]), (-1, [0, 1, 2])]
+    qc = build_polynomial_circuit(3, 4, terms)
+    merged = merge_diagonals(qc.transformations)
+    assert any(isinstance(tr, Diagonal) for tr in merged)
+    assert len(merged) < len(qc.transformations)
+
+    state = generate_state(qc.num_qubits)
+    assert all_close(run(qc, state, True), run(qc, state, False))
+
+
+def test_swaps_relabel_qubits():
+    n = 6
+    qc = random_circuit(n, 80, 7)
+    qc.append_qft(QuantumRegister(n))
+    relabeled, perm = relabel(qc.transformations, n)
+    assert not any(tr.name == 'swap' for tr in relabeled)
+    assert sorted(perm) == list(range(n))
+
+    state = generate_state(n, 7)
+    expected = run(qc, state, False)
+    qc.initialize(state.copy())
+    for (tr, s) in qc.run_and_yield():
+        pass
+    assert all_close(s, expected)
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+
+from hume.simulator.core import init_state, marginal_probabilities, as_counts
+from hume.simulator.memmap import MappedState
+from hume.tests.test_fusion import random_circuit
+from hume.utils.common import all_close, generate_state
+
+
+class Crash(Exception):
+    pass
+
+
+class CrashingState(MappedState):
+    # fails after a number of segments were written to the file, before the progress is saved
+    def __init__(self, *args, segments=0, **kwargs):
+        self.segments = segments
+        super().__init__(*args, **kwargs)
+
+    def save_progress(self, step, segment):
+        if segment > 0:
+            self.segments -= 1
+            if self.segments < 0:
+                raise Crash()
+        super().save_progress(step, segment)
+
+
+def expected_state(n, seed):
+    state = init_state(n)
+    state[:] = generate_state(n, seed)
+    qc = random_circuit(n, 60, seed)
+    qc.initialize(state.copy())
+    return state, qc.run()
+
+
+def test_memmap_same_as_run(tmp_path):
+    n = 7
+    for block_qubits in [3, 5, 7]:
+        state, expected = expected_state(n, block_qubits)
+
+        qc = random_circuit(n, 60, block_qubits)
+        qc.initialize_memmap(str(tmp_path / f'state{block_qubits}'), block_qubits, state=state)
+        assert isinstance(qc.run(), np.memmap)
+        assert all_close(qc.state, expected)
+        assert sum(qc.mapped.measure(50).values()) == 50
+        assert np.allclose(qc.mapped.marginal([6, 1, 4]), marginal_probabilities(expected, [6, 1, 4]))
+        assert qc.measure(20, [6, 1, 4], seed=3)['counts'] == qc.mapped.measure(20, [6, 1, 4], seed=3)
+        result = qc.measure(30, seed=4)
+        assert result['histogram'].sum() == 30 and as_counts(result['histogram']) == result['counts']
+
+
+def test_memmap_run_and_yield(tmp_path):
+    n = 6
+    state, expected = expected_state(n, 1)
+
+    qc = random_circuit(n, 60, 1)
+    qc.fusion = False
+    qc.initialize_memmap(str(tmp_path / 'state'), 3, state=state)
+    for (tr, s) in qc.run_and_yield():
+        pass
+    assert all_close(s, expected)
+
+
+def test_memmap_resume(tmp_path):
+    n = 7
+    path = str(tmp_path / 'state')
+    state, expected = expected_state(n, 2)
+
+    qc = random_circuit(n, 60, 2)
+    qc.mapped = CrashingState(path, n, 4, state=state, segments=37)
+    qc.state = qc.mapped.state
+    with pytest.raises(Crash):
+        qc.run()
+
+    qc = random_circuit(n, 60, 2)
+    qc.initialize_memmap(path, 4, resume=True)
+    assert all_close(qc.run(), expected)
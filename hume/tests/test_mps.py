@@ -0,0 +1,40 @@
+import numpy as np
+
+from hume.algos.function_encoding import build_polynomial_circuit
+from hume.simulator.core import probabilities
+from hume.simulator.mps import MPS
+from hume.tests.test_fusion import random_circuit
+from hume.utils.common import all_close
+
+
+def test_mps_same_as_dense():
+    n = 7
+    for seed in range(3):
+        qc = random_circuit(n, 60, seed)
+        mps = qc.mps()
+        state = qc.run()
+        assert all_close(mps.to_state(), state)
+        assert np.isclose(mps.amplitude(37), state[37])
+        assert np.allclose(mps.sample(20000, seed=seed) / 20000, probabilities(state), atol=0.02)
+        assert mps.report['truncations'] == 0 or mps.report['discarded'] < 1e-10
+
+        assert all_close(MPS.from_state(state).to_state(), state)
+
+
+def test_truncation_report():
+    qc = random_circuit(7, 60, 4)
+    mps = qc.mps(max_bond=2)
+    state = qc.run()
+    assert max(mps.bonds()) == 2 and mps.report['truncations'] > 0
+    # the product of the kept weights tracks the fidelity
+    assert abs(abs(np.vdot(mps.to_state(), state)) ** 2 - mps.report['fidelity']) < 0.01
+
+
+def test_large_polynomial_circuit():
+    # 34 qubits, the dense state is never allocated
+    qc = build_polynomial_circuit(20, 14, [(1, [0]), (2, [3, 4]), (3, [])])
+    mps = qc.mps(max_bond=64)
+    assert qc.dense_state is None and mps.report['fidelity'] > 0.999
+    for k in mps.measure_counts(20, seed=3):
+        key, value = k % 2 ** 20, k >> 20
+        assert value == (key & 1) + 2 * ((key >> 3) & 1) * ((key >> 4) & 1) + 3
@@ -0,0 +1,49 @@
+import numpy as np
+
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.simulator.core import probabilities
+from hume.simulator.noise import NoiseModel, depolarizing, amplitude_damping, bit_flip, phase_flip
+
+
+def bell_circuit():
+    qc = QuantumCircuit(QuantumRegister(2))
+    qc.x(0)
+    qc.h(1)
+    qc.cx(1, 0)
+    return qc
+
+
+def test_noise_matches_channels():
+    qc = bell_circuit()
+    qc.noise = NoiseModel().add(amplitude_damping(0.3), ['x']).add(bit_flip(0.1), ['cx'])
+    qc.trajectories = 4000
+    result = qc.measure(1000, seed=1)
+
+    # q0 is 1 with probability 0.7 after the damping, cx copies q1 into it, then both flip with probability 0.1
+    before = np.array([0.15, 0.35, 0.35, 0.15])
+    flip = np.array([[0.9, 0.1], [0.1, 0.9]])
+    expected = np.kron(flip, flip) @ before
+    assert np.all(np.abs(result['probabilities'] - expected) < 5 * result['standard error'] + 1e-3)
+    assert result['standard error'].max() < 0.01
+    assert sum(result['counts'].values()) == 1000
+
+
+def test_noiseless_model():
+    qc = bell_circuit()
+    qc.noise = NoiseModel().add(depolarizing(0), ['h', 'cx']).add(phase_flip(0), ['x'])
+    qc.trajectories = 10
+    result = qc.measure_noisy(100, register=[1], seed=2)
+    assert np.allclose(result['probabilities'], [0.5, 0.5]) and np.allclose(result['standard error'], 0)
+
+    qc.noise = NoiseModel()
+    assert np.allclose(qc.measure_noisy(0)['probabilities'], probabilities(qc.run()))
+
+
+def test_worker_pool():
+    qc = bell_circuit()
+    qc.noise = NoiseModel().add(depolarizing(0.2), ['h', 'cx'])
+    qc.trajectories = 2000
+    serial = qc.measure_noisy(0, seed=3)
+    pooled = qc.measure_noisy(0, seed=3, processes=2)
+    error = serial['standard error'] + pooled['standard error']
+    assert np.all(np.abs(serial['probabilities'] - pooled['probabilities']) < 5 * error)
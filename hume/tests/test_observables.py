@@ -0,0 +1,45 @@
+import numpy as np
+from qiskit.quantum_info import Pauli, Statevector
+
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.simulator.core import pauli_expectation
+from hume.utils.common import generate_state
+
+
+def test_pauli_same_as_qiskit():
+    n = 4
+    state = np.array(generate_state(n, 10))
+    for pauli in ['IIII', 'XIZY', 'YYXZ', 'ZZZZ', 'IXII']:
+        expected = Statevector(state).expectation_value(Pauli(pauli))
+        assert np.isclose(pauli_expectation(state, pauli), expected.real)
+    assert np.isclose(pauli_expectation(state, {1: 'X', 3: 'Y'}), pauli_expectation(state, 'YIXI'))
+
+
+def test_register_observables():
+    k = QuantumRegister(2)
+    v = QuantumRegister(3)
+    qc = QuantumCircuit(k, v)
+    qc.h(k[0])
+    qc.h(k[1])
+    qc.cx(k[1], v[2])
+    qc.x(v[0])
+    qc.ry(0.3, v[1])
+
+    assert np.allclose(qc.marginal(k), [0.25] * 4)
+    assert np.isclose(qc.expectation(np.arange(4), k), 1.5)
+    assert np.isclose(qc.pauli_expectation('IIZII'), -1)
+    assert np.isclose(qc.pauli_expectation('IIIIZ'), 0)
+
+    # v[2] is back to 0 and v[1] is mostly 0
+    qc.cx(k[1], v[2])
+    assert qc.most_likely(v) == 1
+    assert qc.most_likely() == 0b00100
+
+
+def test_most_likely_signed():
+    qc = QuantumCircuit(QuantumRegister(2), QuantumRegister(4))
+    for q in range(2, 6):
+        qc.x(q)
+    assert qc.most_likely(list(range(2, 6)), signed=True) == -1
+    assert qc.most_likely(list(range(2, 6))) == 15
+
@@ -0,0 +1,46 @@
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.tests.test_fusion import random_circuit, run
+from hume.utils.common import all_close, generate_state
+
+
+def test_observer_deltas():
+    n = 5
+    state = generate_state(n, 12)
+    expected = run(random_circuit(n, 30, 12), state, False)
+
+    qc = random_circuit(n, 30, 12)
+    qc.initialize(state.copy())
+    previous = qc.state.copy()
+    steps = []
+
+    def record(step):
+        # only the reported amplitudes changed since the previous step
+        unchanged = ~step.changed()
+        assert all_close(qc.state[unchanged], previous[unchanged])
+        previous[step.indices()] = step.values
+        steps.append(step.count)
+
+    qc.observe(record, values=True)
+    assert all_close(qc.run(), expected)
+    assert all_close(previous, expected)
+    assert steps == list(range(1, 31))
+
+
+def test_observer_stride():
+    n = 4
+    qc = random_circuit(n, 25, 13)
+    counts = []
+    qc.observe(lambda step: counts.append((step.count, len(step.transformations))), stride=10)
+    qc.run()
+    assert counts == [(10, 10), (20, 10), (25, 5)]
+
+
+def test_phase_gates_change_one_subspace():
+    qc = QuantumCircuit(QuantumRegister(4))
+    qc.h(0)
+    qc.cp(0.3, 0, 2)
+    qc.z(3)
+    sizes = []
+    qc.observe(lambda step: sizes.append(len(step.values)), values=True)
+    qc.run()
+    assert sizes == [16, 4, 8]
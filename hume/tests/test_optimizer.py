@@ -0,0 +1,62 @@
+import numpy as np
+
+from hume.algos.grover import phase_oracle_match, grover_circuit
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.simulator.parameter import Parameter
+from hume.tests.test_fusion import random_circuit
+
+
+def optimized_same_unitary(qc):
+    U = qc.to_unitary()
+    report = qc.optimize()
+    assert np.allclose(qc.to_unitary(), U)
+    return report
+
+
+def test_cancel_merge_drop():
+    qc = QuantumCircuit(QuantumRegister(3))
+    qc.x(0)
+    qc.h(1)
+    qc.h(1)
+    qc.x(0)
+    qc.rz(0.3, 2)
+    qc.cx(0, 1)
+    # commutes with both cx (diagonal on their control), so they meet and cancel
+    qc.z(0)
+    qc.cx(0, 1)
+    qc.rz(0.4, 2)
+    qc.cp(0.5, 0, 2)
+    qc.cp(-0.5, 2, 0)
+    qc.p(0, 1)
+
+    report = optimized_same_unitary(qc)
+    assert [(tr.name, tr.target) for tr in qc.transformations] == [('rz', 2), ('z', 0)]
+    assert np.isclose(qc.transformations[0].arg, 0.7)
+    assert report == {'before': 12, 'cancelled': 3, 'merged': 2, 'dropped': 2, 'after': 2}
+
+
+def test_parametric_rotations():
+    theta = Parameter('theta')
+    qc = QuantumCircuit(QuantumRegister(1))
+    qc.h(0)
+    qc.ry(theta, 0)
+    qc.ry(0.25, 0)
+    qc.optimize()
+    assert len(qc.transformations) == 2
+
+    reference = QuantumCircuit(QuantumRegister(1))
+    reference.h(0)
+    reference.ry(1.25, 0)
+    assert np.allclose(qc.bind({'theta': 1}).run(), reference.run())
+
+
+def test_grover_and_random_circuits():
+    n = 4
+    prepare = QuantumCircuit(QuantumRegister(n))
+    for q in range(n):
+        prepare.h(q)
+    report = optimized_same_unitary(grover_circuit(prepare, phase_oracle_match(n, [3, 5, 6, 9]), 3))
+    assert report['after'] < report['before']
+
+    for seed in range(10):
+        optimized_same_unitary(random_circuit(5, 80, seed))
@@ -0,0 +1,81 @@
+from math import pi
+
+import numpy as np
+import pytest
+
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.simulator.parameter import Parameter
+from hume.utils.common import all_close, generate_state
+
+
+def build(theta, phi):
+    n = 4
+    qc = QuantumCircuit(QuantumRegister(n))
+    for t in range(n):
+        qc.h(t)
+        qc.ry(theta, t)
+    qc.cp(2 * theta, 0, 1)
+    qc.p(phi - 0.3, 2)
+    qc.rz(phi, 2)
+    qc.mcp(-theta, [0, 1, 2], 3)
+    qc.cry(phi / 2, 3, 0)
+    qc.swap(0, 3)
+    qc.rx(0.5 - theta, 1)
+    return qc
+
+
+def test_bind_same_as_numeric():
+    n = 4
+    state = generate_state(n, 5)
+    qc = build(Parameter('theta'), Parameter('phi'))
+    plan = qc.compile()
+    assert plan.parameters == ['phi', 'theta']
+
+    for (theta, phi) in [(0.3, 1.2), (0, 0), (pi, -pi / 2)]:
+        expected = build(theta, phi)
+        expected.initialize(state.copy())
+        assert all_close(plan.bind({'theta': theta, 'phi': phi}).run(state), expected.run())
+        assert qc.compile() is plan
+
+    qc.initialize(state.copy())
+    qc.bind({'theta': 0.3, 'phi': 1.2})
+    expected = build(0.3, 1.2)
+    expected.initialize(state.copy())
+    assert all_close(qc.run(), expected.run())
+
+
+def test_inverse_negates_parameters():
+    n = 4
+    state = generate_state(n, 6)
+    qc = build(Parameter('theta'), Parameter('phi'))
+    qc.append(qc.inverse(), QuantumRegister(n))
+    qc.initialize(state.copy())
+    assert all_close(qc.bind({'theta': 0.7, 'phi': -0.4}).run(), state)
+
+
+def test_sweep_same_as_bind():
+    n = 4
+    state = generate_state(n, 7)
+    thetas = np.linspace(-pi, pi, 7)
+    phis = np.linspace(0, 2, 7)
+    for fusion in [True, False]:
+        qc = build(Parameter('theta'), Parameter('phi'))
+        qc.fusion = fusion
+        qc.initialize(state.copy())
+        states = qc.sweep({'theta': thetas, 'phi': phis})
+        assert states.shape == (7, 2 ** n)
+        probabilities = qc.sweep({'theta': thetas, 'phi': phis}, probabilities=True)
+
+        plan = qc.compile()
+        for (k, (theta, phi)) in enumerate(zip(thetas, phis)):
+            expected = plan.bind({'theta': theta, 'phi': phi}).run(state)
+            assert all_close(states[k], expected)
+            assert np.allclose(probabilities[k], np.abs(expected) ** 2)
+
+
+def test_sweep_checks_values():
+    qc = build(Parameter('theta'), Parameter('phi'))
+    with pytest.raises(ValueError):
+        qc.sweep({'theta': np.zeros(3)})
+    with pytest.raises(ValueError):
+        qc.sweep({'theta': np.zeros(3), 'phi': np.zeros(4)})
@@ -0,0 +1,53 @@
+import pickle
+
+import numpy as np
+
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.tests.test_fusion import random_circuit, run
+from hume.utils.common import all_close, generate_state
+
+
+def test_plan_same_as_run():
+    n = 6
+    for fusion in [True, False]:
+        qc = random_circuit(n, 60, 3)
+        qc.fusion = fusion
+        plan = qc.compile()
+        assert qc.compile() is plan
+        assert len(qc.transformations) == 60
+
+        for seed in range(3):
+            state = generate_state(n, seed)
+            result = plan.run(state)
+            assert all_close(result, run(qc, state, fusion))
+            assert all_close(pickle.loads(pickle.dumps(plan)).run(state), result)
+
+        assert all_close(plan.run(), run(qc, np.eye(1, 2 ** n, dtype=complex)[0], fusion))
+
+
+def test_plan_shares_matrices():
+    n = 5
+    qc = QuantumCircuit(QuantumRegister(n))
+    qc.fusion = False
+    for _ in range(3):
+        for t in range(n):
+            qc.h(t)
+            qc.cx(t, (t + 1) % n)
+    plan = qc.compile()
+    assert len(plan) == 30
+    assert len(plan.matrices) == 2
+    assert not plan.opcodes.flags.writeable
+
+    qc.x(0)
+    assert qc.compile() is not plan
+
+
+def test_run_batch():
+    n = 5
+    qc = random_circuit(n, 40, 4)
+    states = np.array([generate_state(n, seed) for seed in range(6)])
+    results = qc.run_batch(states)
+    assert results.shape == states.shape
+
+    for (state, result) in zip(states, results):
+        assert all_close(result, run(qc, state, True))
@@ -0,0 +1,35 @@
+import random
+
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.utils.common import all_close
+
+
+def stepped_circuit(n, steps, budget=None, every=16):
+    random.seed(11)
+    qc = QuantumCircuit(QuantumRegister(n))
+    qc.reports.budget = budget
+    qc.reports.every = every
+    for step in range(steps):
+        t = random.randrange(n)
+        qc.h(t)
+        qc.cp(random.uniform(-1, 1), t, (t + 1) % n)
+        qc.report(f'Step {step + 1}')
+    return qc
+
+
+def test_reports_within_budget():
+    n = 6
+    full = stepped_circuit(n, 40)
+    budget = 3 * 2 ** n * 16
+    qc = stepped_circuit(n, 40, budget=budget, every=8)
+    # checkpoints count against the budget too, they get thinned to every 32nd report
+    assert list(qc.reports.checkpoints) == ['Step 1', 'Step 33'] and qc.reports.every == 32
+    assert qc.reports.size() <= budget
+
+    for step in [40, 3, 17, 16, 1, 39]:
+        name = f'Step {step}'
+        start, transformations, end, count = qc.reports[name]
+        assert all_close(end, full.reports[name][2])
+        assert all_close(start, full.reports[name][0])
+        assert len(transformations) == 2 and count == 2 * step
+        assert qc.reports.size() <= budget
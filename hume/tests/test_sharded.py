@@ -0,0 +1,44 @@
+import pytest
+
+from hume.algos.grover import amplitude_estimation_circuit, prepare_uniform, phase_oracle_match
+from hume.simulator.core import init_state
+from hume.simulator.sharded import Shards
+from hume.tests.test_fusion import random_circuit
+from hume.utils.common import all_close, generate_state
+
+
+def test_sharded_same_as_run():
+    n = 7
+    state = init_state(n)
+    state[:] = generate_state(n)
+
+    for (global_qubits, processes) in [(1, 2), (2, 2), (3, 4)]:
+        qc = random_circuit(n, 80, global_qubits)
+        qc.initialize(state.copy())
+        expected = qc.run()
+
+        qc = random_circuit(n, 80, global_qubits)
+        qc.initialize(state.copy())
+        assert all_close(qc.run_sharded(processes, global_qubits), expected)
+
+
+def test_sharded_amplitude_estimation():
+    qc = amplitude_estimation_circuit(3, prepare_uniform(3), phase_oracle_match(3, [1, 2]))
+    expected = qc.run()
+
+    qc = amplitude_estimation_circuit(3, prepare_uniform(3), phase_oracle_match(3, [1, 2]))
+    assert all_close(qc.run_sharded(4), expected)
+
+
+def test_sharded_from_zero_state():
+    qc = random_circuit(6, 60, 2)
+    expected = qc.run()
+
+    qc = random_circuit(6, 60, 2)
+    state = qc.run_sharded(4, 3)
+    assert qc.state is state and all_close(state, expected)
+
+
+def test_shards_is_abstract():
+    with pytest.raises(TypeError):
+        Shards(3, 1)
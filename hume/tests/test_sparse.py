@@ -0,0 +1,61 @@
+import numpy as np
+
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.simulator.core import init_state
+from hume.simulator.sparse import SparseState
+from hume.tests.test_fusion import random_circuit
+from hume.utils.common import all_close
+
+
+def run(qc, sparse):
+    transformations = qc.transformations.copy()
+    qc.initialize(init_state(qc.num_qubits))
+    qc.sparse = sparse
+    result = qc.run()
+    qc.transformations = transformations
+    return result
+
+
+def test_sparse_same_as_dense():
+    n = 10
+    for (seed, fusion) in [(14, True), (15, False)]:
+        qc = random_circuit(n, 40, seed)
+        qc.fusion = fusion
+        assert all_close(run(qc, True), run(qc, False))
+
+
+def test_sparse_switch_over():
+    n = 10
+    qc = QuantumCircuit(QuantumRegister(n))
+    qc.fusion = False
+    for q in [1, 4, 7]:
+        qc.x(q)
+    qc.swap(1, 8)
+    qc.mcp(0.5, [4, 7], 8)
+    qc.cx(4, 2)
+    # dense after the first layer, back to a basis state after the second one
+    for _ in range(2):
+        for q in range(n):
+            qc.h(q)
+    for q in range(n):
+        qc.p(0.1 * q, q)
+        qc.cz(q, (q + 1) % n)
+    expected = run(qc, False)
+    assert all_close(run(qc, True), expected)
+
+    sparse = SparseState.from_dense(expected)
+    assert len(sparse.indices) < 2 ** n / 64
+    state = np.zeros(2 ** n, dtype=complex)
+    sparse.write(state)
+    assert all_close(state, expected)
+
+
+def test_single_precision_small_amplitudes():
+    # amplitudes far below 1e3 ulps are real, not residues
+    qc = QuantumCircuit(QuantumRegister(10), dtype=np.complex64)
+    qc.ry(4e-4, 0)
+    qc.ry(1.0, 5)
+    expected = run(qc, False)
+    state = run(qc, True)
+    assert np.count_nonzero(state) == 4
+    assert np.allclose(state, expected, rtol=1e-5, atol=0)
@@ -0,0 +1,78 @@
+from math import pi
+
+import numpy as np
+import pytest
+
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.simulator.core import init_state
+from hume.simulator.stabilizer import Tableau, clifford_prefix, parity
+from hume.utils.common import all_close
+
+
+def random_clifford(n, m, seed):
+    rng = np.random.default_rng(seed)
+    qc = QuantumCircuit(QuantumRegister(n))
+    for _ in range(m):
+        a, b = (int(q) for q in rng.choice(n, 2, replace=False))
+        k = int(rng.integers(-3, 4))
+        [lambda: qc.h(a), lambda: qc.x(a), lambda: qc.y(a), lambda: qc.z(a), lambda: qc.cx(a, b),
+         lambda: qc.cz(a, b), lambda: qc.p(k * pi / 2, a), lambda: qc.rz(k * pi / 2, a), lambda: qc.swap(a, b),
+         lambda: qc.cp(pi, a, b)][rng.integers(10)]()
+    return qc
+
+
+def run_dense(qc):
+    transformations = qc.transformations.copy()
+    qc.initialize(init_state(qc.num_qubits))
+    qc.stabilizer = False
+    state = qc.run()
+    qc.transformations = transformations
+    qc.initialize(init_state(qc.num_qubits))
+    qc.stabilizer = True
+    return state
+
+
+def test_tableau_same_as_dense():
+    for seed in range(10):
+        qc = random_clifford(5, 40, seed)
+        state = run_dense(qc)
+        assert all_close(qc.tableau().to_state(), state)
+
+        p = np.abs(state) ** 2
+        assert np.allclose(qc.tableau().sample(20000, seed=seed) / 20000, p, atol=0.02)
+
+
+def test_clifford_prefix_hand_off():
+    qc = random_clifford(6, 30, 1)
+    qc.rx(0.3, 2)
+    qc.h(0)
+    qc.cp(0.7, 1, 4)
+    assert clifford_prefix(qc.transformations) == 30
+    state = run_dense(qc)
+    assert all_close(qc.run(), state)
+
+
+def test_large_ghz():
+    n = 300
+    t = Tableau(n)
+    t.h(0)
+    for q in range(n - 1):
+        t.cx(q, q + 1)
+    counts = t.measure_counts(1000, seed=5)
+    assert set(counts) == {0, 2 ** n - 1}
+    assert t.sample(1000, [0, 150, 299], seed=5)[[1, 2, 3, 4, 5, 6]].sum() == 0
+
+    assert t.measure(17) == t.measure(200)
+
+
+def test_parity():
+    v = np.random.default_rng(5).integers(0, 2 ** 62, 1000)
+    assert np.array_equal(parity(v), [bin(int(k)).count('1') % 2 for k in v])
+
+
+def test_tableau_needs_basis_state():
+    qc = QuantumCircuit(QuantumRegister(2))
+    qc.initialize(np.array([1, 1, 0, 0]) / np.sqrt(2))
+    qc.h(0)
+    with pytest.raises(ValueError):
+        qc.tableau()
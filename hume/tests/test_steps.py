@@ -0,0 +1,64 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from components.any_qubit_component import AnyQubit
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+
+
+def state_of(component):
+    reports = component.qc.reports
+    return reports.end_state(f'Step {len(reports)}') if len(reports) else component.qc.state
+
+
+def reference(gates, n=2):
+    qc = QuantumCircuit(QuantumRegister(n))
+    for (target, gate, angle) in gates:
+        if angle is None:
+            getattr(qc, gate)(target)
+        else:
+            getattr(qc, gate)(angle / 180 * np.pi, target)
+    return qc.run()
+
+
+def test_undo_redo_jump():
+    gates = [(0, 'h', None), (1, 'ry', 30), (0, 'p', 0), (1, 'rz', 0), (0, 'x', None)]
+    component = AnyQubit(2)
+    for g in gates:
+        component.apply_gate(*g)
+
+    # zero angles used to break the inverse and lose the step
+    for k in range(len(gates), 0, -1):
+        assert component.undo()
+        assert np.allclose(state_of(component), reference(gates[:k - 1]))
+    assert not component.undo()
+
+    assert component.jump(3) == 3
+    assert np.allclose(state_of(component), reference(gates[:3]))
+    assert component.redo() and component.last_step() == 4
+    assert component.jump(5) == 5
+    assert np.allclose(state_of(component), reference(gates))
+
+
+def test_new_gate_clears_redo():
+    component = AnyQubit(1)
+    component.apply_gate(0, 'h')
+    component.apply_gate(0, 'p', 0)
+    assert component.undo()
+    component.apply_gate(0, 'x')
+    assert not component.redo()
+    assert component.last_step() == 2
+    assert np.allclose(state_of(component), reference([(0, 'h', None), (0, 'x', None)], 1))
+
+
+def test_server_tools():
+    server = pytest.importorskip('server')
+    asyncio.run(server.create_circuit(1))
+    asyncio.run(server.apply_gate(0, 'p', 0))
+    asyncio.run(server.apply_gate(0, 'h'))
+    assert 'There is no step' not in asyncio.run(server.undo_step())
+    assert 'There is no step' not in asyncio.run(server.undo_step())
+    assert asyncio.run(server.undo_step()) == 'There is no step to undo.'
+    assert asyncio.run(server.go_to_step(2)).startswith('Step 2')
+    assert asyncio.run(server.redo_step()) == 'There is no step to redo.'
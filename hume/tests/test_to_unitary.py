@@ -0,0 +1,44 @@
+import numpy as np
+
+from hume.algos.grover import grover_circuit, grover_sim_unitary, phase_oracle_match, prepare_uniform
+from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.tests.test_fusion import random_circuit, run
+from hume.utils.common import all_close, generate_state
+from hume.utils.matrix import rvs
+
+
+def test_to_unitary_same_as_run():
+    n = 5
+    qc = random_circuit(n, 50, 8)
+    U = qc.to_unitary()
+    assert qc.to_unitary() is U
+    assert np.allclose(U @ U.conj().T, np.eye(2 ** n))
+
+    state = generate_state(n, 8)
+    assert all_close(U @ state, run(qc, state, True))
+
+
+def test_to_unitary_blocks():
+    c = QuantumRegister(2)
+    q = QuantumRegister(3)
+    qc = QuantumCircuit(c, q)
+    qc.mc_append_u(rvs(8), [c[0], c[1]], q)
+    qc.cp(0.4, q[0], c[1])
+    qc.c_unitary(rvs(4), c[0], q[1])
+    U = qc.to_unitary()
+
+    fixed, free, blocks = qc.to_unitary('blocks')
+    assert fixed == [0, 1]
+    assert free == [2, 3, 4]
+    assert len(blocks) == 4 and blocks[0].shape == (8, 8)
+
+    sparse = qc.to_unitary('sparse')
+    assert sparse.nnz <= 4 * 8 * 8
+    assert np.allclose(sparse.toarray(), U)
+
+
+def test_grover_from_unitary():
+    n = 3
+    A = prepare_uniform(n)
+    expected = grover_circuit(A, phase_oracle_match(n, [5]), 2).run()
+    assert all_close(grover_sim_unitary(A.to_unitary(), lambda k: k == 5, 2), expected)
@@ -1,7 +1,12 @@
 from math import pi
 
+from qiskit.quantum_info import Statevector
+
 from hume.simulator.circuit import QuantumCircuit, QuantumRegister
+from hume.simulator.parameter import Parameter
 from hume.qiskit.util import same_as_qiskit, hume_to_qiskit
+from hume.utils.common import all_close, generate_state
+from hume.utils.matrix import rvs
 
 
 def encode_value_q(n, v):
@@ -31,5 +36,49 @@ def test_same_as_qiskit():
     same_as_qiskit(qc)
 
 
+def test_controlled_unitaries_same_as_qiskit():
+    c = QuantumRegister(3)
+    q = QuantumRegister(2)
+    qc = QuantumCircuit(c, q)
+
+    for i in range(len(c)):
+        qc.h(c[i])
+    qc.append_u(rvs(4), q)
+    qc.c_append_u(rvs(4), c[1], q)
+    qc.mc_append_u(rvs(4), [c[0], c[2]], q)
+    qc.mc_unitary(rvs(2), [q[1], c[2], c[0]], c[1])
+
+    assert same_as_qiskit(qc)
+
+
+def test_controlled_unitary_inverse():
+    c = QuantumRegister(2)
+    q = QuantumRegister(3)
+    qc = QuantumCircuit(c, q)
+    qc.mc_append_u(rvs(8), [c[0], c[1]], q)
+    qc.c_unitary(rvs(4), c[1], q[1])
+
+    state = generate_state(5)
+    qc.initialize(list(state))
+    qc.append(qc.inverse(), QuantumRegister(5))
+
+    assert all_close(qc.run(), state)
+
+
+def test_parameters_to_qiskit():
+    theta = Parameter('theta')
+    qc = QuantumCircuit(QuantumRegister(3))
+    qc.h(0)
+    qc.ry(theta, 0)
+    qc.cp(2 * theta + 0.5, 0, 1)
+    qc.mcp(-theta, [0, 1], 2)
+    qc.cp(0, 1, 2)
+
+    qc_qiskit = hume_to_qiskit(qc.regs, qc.transformations)
+    assert [p.name for p in qc_qiskit.parameters] == ['theta']
+    bound = qc_qiskit.assign_parameters({qc_qiskit.parameters[0]: 0.7})
+    assert all_close(qc.bind({'theta': 0.7}).run(), Statevector(bound).data)
+
+
 if __name__ == "__main__":
     test_same_as_qiskit()
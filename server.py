@@ -84,5 +84,40 @@ async def reset_circuit() -> str:
     circuit.reset()
     return f"{circuit.get_state()}"
 
+@mcp.tool()
+async def undo_step() -> str:
+    """
+    Undoes the last gate applied to the circuit. Returns the state after undoing. Takes no arguments.
+    """
+    if not circuit.undo():
+        return "There is no step to undo."
+    return f"{circuit.get_state()}"
+
+@mcp.tool()
+async def redo_step() -> str:
+    """
+    Applies again the last undone gate. Returns the state after redoing. Takes no arguments.
+    """
+    if not circuit.redo():
+        return "There is no step to redo."
+    return f"{circuit.get_state()}"
+
+@mcp.tool()
+async def go_to_step(step: int) -> str:
+    """
+    Moves the circuit to the state after a given step, undoing or redoing gates as needed.
+
+    Args:
+        step: The step number (integer, 0 is the initial state). Steps after the last redoable one are not reachable.
+
+    Returns:
+        A string representation of the state at the reached step.
+    """
+    if not isinstance(step, int) or step < 0:
+        return "Please choose a valid step number."
+
+    reached = circuit.jump(step)
+    return f"Step {reached}\n{circuit.get_state()}"
+
 if __name__ == "__main__":
     mcp.run(transport='stdio')
\ No newline at end of file